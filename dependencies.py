@@ -29,10 +29,14 @@ DEPS = [
 		"systems": ["Windows"]
 	},
 	{
-		"command": "which xdotool",
-		"label": "xdotool",
-		"debian": "xdotools",
-		"systems": ["Linux"]
+		"module": "Xlib",
+		"label": "python-xlib (or xdotool)",
+		"pip": "python-xlib",
+		"debian": "python3-xlib",
+		"systems": ["Linux"],
+		"alternative": {
+			"command": "which xdotool"
+		}
 	}
 ]
 
@@ -22,9 +22,9 @@ def find_preferred_engine():
 		return 'webengine'
 	return None
 
-# Requires at least Python 3.4
-if sys.version_info < (3,4):
-	sys.stderr.write("This program requires at least Python 3.4, found version %d.%d.%d%s" % (
+# Requires at least Python 3.7
+if sys.version_info < (3,7):
+	sys.stderr.write("This program requires at least Python 3.7, found version %d.%d.%d%s" % (
 		sys.version_info[0], sys.version_info[1], sys.version_info[2], os.linesep
 	))
 	sys.exit(1)
@@ -42,12 +42,16 @@ if util.find_spec("psutil") is None:
 	sys.stderr.write("Module 'psutil' not found. Maybe you need to install 'python3-psutil'.%s" % os.linesep)
 	sys.exit(1)
 
+# Enable profiling before PyQt5 is imported to include it in the report
+if '--profile-startup' in sys.argv:
+	from gameplay import profiling
+	profiling.enable()
+
 import argparse
 import signal
 import logging
 
-from PyQt5.Qt import Qt
-from PyQt5.QtCore import QDir, QStandardPaths
+from PyQt5.QtCore import Qt, QDir, QStandardPaths, QTimer
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QIcon
 
@@ -92,6 +96,7 @@ def main():
 	parser.add_argument("-r", "--docroot", help="Document root of UI files (default: %s)" % (basepath), default=basepath)
 	parser.add_argument("--list-config", help="Show what configuration files are loaded on startup", action="store_true")
 	parser.add_argument("--list-apps", help="Show what apps where found by each application provider", action="store_true")
+	parser.add_argument("--profile-startup", help="Print the import and initialization times of the slowest modules after startup", action="store_true")
 	args = parser.parse_args()
 
 	# Ensure that the given document root ends with /
@@ -111,8 +116,9 @@ def main():
 	LOGGER = logging.getLogger(__name__)
 
 	# This must be imported AFTER logging has been configured!
-	from gameplay import GamePlay
-	from gameplay import Frontend
+	from gameplay.GamePlay import GamePlay
+	from gameplay.Frontend import Frontend
+	from gameplay import profiling
 
 	# Import Engine package before QCore is instanceated
 	if args.engine == 'webkit':
@@ -120,12 +126,19 @@ def main():
 	else:
 		from gameplay.platform.WebengineWebView import WebView, Inspector
 
+	if sys.platform.startswith('win'):
+		# Sets the taskbar's AppUserModelID, which must be done early
+		from gameplay.platform import system_module
+		system_module()
+
 	# Start application (and ensure it can be killed with CTRL-C)
 	signal.signal(signal.SIGINT, signal.SIG_DFL)
-	app = QApplication(sys.argv)
-	app.setApplicationName('gameplay')
-	app.setWindowIcon(QIcon(args.docroot + 'img' + os.sep + 'Y.svg'))
-	gameplay = GamePlay()
+	with profiling.measure('QApplication'):
+		app = QApplication(sys.argv)
+		app.setApplicationName('gameplay')
+		app.setWindowIcon(QIcon(args.docroot + 'img' + os.sep + 'Y.svg'))
+	with profiling.measure('GamePlay'):
+		gameplay = GamePlay()
 
 	if args.list_config or args.list_apps:
 		if args.list_config:
@@ -135,10 +148,12 @@ def main():
 		if args.list_apps:
 			for key, provider in gameplay.providers.items():
 				do_list_apps(key, provider)
+		profiling.report()
 		return
 
 	# Initialize frontend
-	frontend = Frontend(args, gameplay)
+	with profiling.measure('Frontend'):
+		frontend = Frontend(args, gameplay)
 
 	if args.stayontop:
 		LOGGER.info('Enable WindowStayOnTop')
@@ -150,6 +165,8 @@ def main():
 	else:
 		frontend.show()
 
+	# Report as soon as the event loop is running
+	QTimer.singleShot(0, profiling.report)
 	sys.exit(app.exec_())
 
 if __name__ == "__main__":
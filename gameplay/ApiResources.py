@@ -0,0 +1,122 @@
+"""
+Read-only JSON resources for the 'gameplay://api/' url scheme.
+
+The resources are serialized once and served from memory until the
+underlying data changes, which is detected by comparing a cheap source
+value like the catalog version. Each response carries an ETag (derived
+from the body) and a Last-Modified header, so a conditional request for
+unchanged data is answered with 304 without building the body again.
+The app status is built again after the ProcessMonitor has reported a
+change, so it may lag behind by one monitor interval.
+
+Resources:
+	apps            All apps, see GamePlay.getAppChanges()
+	apps?since=N    Changes of the app catalog since version N
+	options         Merged values of 'gameplay.ini'
+	status          Status of all running apps
+"""
+
+import json
+import time
+import hashlib
+import logging
+
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import parse_qs
+
+LOGGER = logging.getLogger(__name__)
+
+# Maximum number of cached responses
+MAX_ENTRIES = 32
+
+class _Entry:
+	__slots__ = ('source', 'body', 'etag', 'modified')
+
+	def __init__(self, source, body, etag, modified):
+		self.source = source
+		self.body = body
+		self.etag = etag
+		self.modified = modified
+
+class ApiResources:
+	def __init__(self, gameplay):
+		self.gameplay = gameplay
+		self._entries = {}
+		self._resources = {
+			'apps': self._apps,
+			'options': self._options,
+			'status': self._status
+		}
+
+	def _apps(self, query):
+		since = int(query.get('since', ['0'])[0])
+		return ((self.gameplay.appVersion, since), lambda: self.gameplay.getAppChanges(since))
+
+	def _options(self, query):
+		snapshot = self.gameplay.settings.snapshot()
+		return (snapshot, lambda: snapshot)
+
+	def _status(self, query):
+		return (self.gameplay.monitor.version, self.gameplay.getAllAppStatus)
+
+	def _entry(self, key, source, build):
+		""" Returns the cached entry for 'key' or rebuilds it if
+		'source' differs from the one it has been built from.
+		"""
+		entry = self._entries.get(key)
+		if entry is not None and source is not None and (entry.source is source or entry.source == source):
+			return entry
+
+		body = json.dumps(build(), separators=(',', ':')).encode('UTF-8')
+		etag = '"%s"' % hashlib.sha1(body).hexdigest()
+		if entry is not None and entry.etag == etag:
+			entry.source = source
+			return entry
+
+		if key not in self._entries and len(self._entries) >= MAX_ENTRIES:
+			self._entries.clear()
+		entry = _Entry(source, body, etag, time.time())
+		self._entries[key] = entry
+		return entry
+
+	def _not_modified(self, entry, if_none_match, if_modified_since):
+		if if_none_match:
+			return entry.etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+		if if_modified_since:
+			# The date has a resolution of one second, so a change in the
+			# same second as the previous response would not be noticed
+			try:
+				return entry.modified < parsedate_to_datetime(if_modified_since).timestamp()
+			except (TypeError, ValueError):
+				return False
+		return False
+
+	def request(self, path, query='', if_none_match=None, if_modified_since=None):
+		""" Answers a GET request for 'path' (e.g. 'apps') with the
+		query string 'query'. Returns a tuple (status, headers, body)
+		where 'status' is 200, 304 or 404.
+		"""
+		path = path.strip('/')
+		resource = self._resources.get(path)
+		if resource is None:
+			return (404, {}, b'')
+
+		try:
+			parsed = parse_qs(query or '')
+			(source, build) = resource(parsed)
+		except ValueError:
+			LOGGER.warning("Invalid query for 'gameplay://api/%s': %s" % (path, query))
+			return (404, {}, b'')
+		entry = self._entry((path, query or ''), source, build)
+
+		headers = {
+			'Content-Type': 'application/json; charset=utf-8',
+			'Cache-Control': 'no-cache',
+			'ETag': entry.etag,
+			'Last-Modified': formatdate(entry.modified, usegmt=True)
+		}
+		if self._not_modified(entry, if_none_match, if_modified_since):
+			return (304, headers, b'')
+		return (200, headers, entry.body)
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
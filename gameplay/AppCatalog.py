@@ -0,0 +1,178 @@
+"""
+Persistent catalog for data extracted by the application providers.
+
+Scanning for apps is expensive: emulator ROM trees have to be walked,
+Steam manifests parsed and external commands like 'wit' or 'scummvm -t'
+executed. The AppCatalog stores these results per provider section and
+source path in a SQLite database below the application's cache location,
+together with the modification time and size of the source file.
+
+An entry is only used if the source's mtime and size have not changed,
+so a warm start only re-examines files that have been modified.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import logging
+
+from PyQt5.QtCore import QStandardPaths, QDir
+
+LOGGER = logging.getLogger(__name__)
+
+# Increase this whenever the format of the stored values changes.
+# Existing catalogs with a different version are discarded.
+CATALOG_VERSION = 3
+
+# Sections that are not used anymore. Their entries are
+# removed when the catalog is loaded.
+RETIRED_SECTIONS = (
+	'desktop', # replaced by 'desktop/entries'
+)
+
+_MISSING = object()
+
+def stat_signature(path):
+	""" Returns a (mtime, size) tuple for the given path
+	or None if the path cannot be accessed.
+	"""
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return (st.st_mtime_ns, st.st_size)
+
+class AppCatalog:
+	"""
+	Maps (section, path) to a JSON serializable value. The section is
+	chosen by the provider and should contain everything else the value
+	depends on, e.g. the name of the image info handler.
+
+	All entries are loaded into memory on construction, so lookups are
+	cheap and may be done from any thread. Modified entries are written
+	back when save() is called.
+	"""
+
+	def __init__(self, filename='catalog.sqlite'):
+		self._file = QDir.toNativeSeparators(QStandardPaths.writableLocation(QStandardPaths.CacheLocation) + '/' + filename)
+		self._lock = threading.Lock()
+		# (section, path) -> [mtime, size, json value]
+		self._entries = {}
+		self._dirty = set()
+		self._used = set()
+		self._load()
+
+	def _connect(self):
+		db = sqlite3.connect(self._file)
+		db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+		db.execute('CREATE TABLE IF NOT EXISTS entries (section TEXT, path TEXT, mtime INTEGER, size INTEGER, value TEXT, PRIMARY KEY (section, path))')
+		return db
+
+	def _load(self):
+		if not os.path.exists(self._file):
+			return
+		try:
+			db = self._connect()
+			try:
+				row = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+				if row is None or row[0] != str(CATALOG_VERSION):
+					LOGGER.info('Discarding app catalog "%s" with outdated version' % self._file)
+					db.execute('DELETE FROM entries')
+					db.commit()
+					return
+				retired = False
+				for (section, path, mtime, size, value) in db.execute('SELECT section, path, mtime, size, value FROM entries'):
+					if section in RETIRED_SECTIONS:
+						retired = True
+					else:
+						self._entries[(section, path)] = [mtime, size, value]
+				if retired:
+					with db:
+						db.executemany('DELETE FROM entries WHERE section = ?', [(section,) for section in RETIRED_SECTIONS])
+				LOGGER.info('Loaded %d entries from app catalog "%s"' % (len(self._entries), self._file))
+			finally:
+				db.close()
+		except:
+			LOGGER.exception('Failed to load app catalog from "%s"' % self._file)
+			self._entries = {}
+
+	def get(self, section, path, fallback=None, signature=None):
+		""" Returns the cached value for path if the file's mtime and size
+		haven't changed since the value has been stored. Otherwise returns
+		'fallback'. If the caller already knows the stat signature of
+		the path it can be passed to avoid another stat call.
+		"""
+		if signature is None:
+			signature = stat_signature(path)
+		if signature is None:
+			return fallback
+		key = (section, path)
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None or entry[0] != signature[0] or entry[1] != signature[1]:
+				return fallback
+			self._used.add(key)
+			value = entry[2]
+		return json.loads(value)
+
+	def put(self, section, path, value, signature=None):
+		""" Stores a value for the given path. Does nothing
+		if the path does not exist.
+		"""
+		if signature is None:
+			signature = stat_signature(path)
+		if signature is None:
+			return
+		key = (section, path)
+		entry = [signature[0], signature[1], json.dumps(value)]
+		with self._lock:
+			self._entries[key] = entry
+			self._dirty.add(key)
+			self._used.add(key)
+
+	def cached(self, section, path, func, signature=None):
+		""" Returns the cached value for path or stores
+		and returns the result of func(path).
+		"""
+		if signature is None:
+			signature = stat_signature(path)
+		value = self.get(section, path, _MISSING, signature)
+		if value is _MISSING:
+			value = func(path)
+			self.put(section, path, value, signature)
+		return value
+
+	def save(self):
+		""" Writes modified entries back to disk. Entries that haven't been
+		used in this session and whose source does not exist anymore
+		are removed. Entries with a key that is not an absolute path,
+		like the fingerprint keys of the EmulatorProvider, don't refer
+		to a file and are kept.
+		"""
+		with self._lock:
+			dirty = [(k[0], k[1], self._entries[k][0], self._entries[k][1], self._entries[k][2]) for k in self._dirty]
+			stale = [k for k in self._entries if k not in self._used and os.path.isabs(k[1]) and not os.path.exists(k[1])]
+			for key in stale:
+				del self._entries[key]
+			self._dirty = set()
+
+		if not dirty and not stale:
+			return
+
+		try:
+			if not os.path.exists(os.path.dirname(self._file)):
+				os.makedirs(os.path.dirname(self._file))
+			db = self._connect()
+			try:
+				with db:
+					db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(CATALOG_VERSION),))
+					db.executemany('INSERT OR REPLACE INTO entries (section, path, mtime, size, value) VALUES (?, ?, ?, ?, ?)', dirty)
+					db.executemany('DELETE FROM entries WHERE section = ? AND path = ?', stale)
+			finally:
+				db.close()
+			LOGGER.info('Saved app catalog to "%s" (%d updated, %d removed)' % (self._file, len(dirty), len(stale)))
+		except:
+			LOGGER.exception('Failed to save app catalog to "%s"' % self._file)
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
@@ -8,81 +8,172 @@ Emulators, local .desktop entries or the application menu.
 Each implementation must implement at least AppProvider
 """
 
+import time
+import signal
 from subprocess import Popen
 from  psutil import Process, NoSuchProcess, STATUS_DEAD, wait_procs
 import logging
 LOGGER = logging.getLogger(__name__)
 
-# Load platform dependent utils
-import platform
-system = platform.system()
-if system == 'Linux':
-	LOGGER.info('Detected Linux system')
-	from .platform import linux as gameplay_sys
-elif system == 'Darwin':
-	LOGGER.info('Detected Darwin system')
-	from .platform import darwin as gameplay_sys
-elif system == 'Windows':
-	LOGGER.info('Detected Windows system')
-	from .platform import windows as gameplay_sys
-else:
-	# Try with linux as fallback...
-	LOGGER.info('Detected unknown system, using Linux API')
-	from .platform import linux as gameplay_sys
+from .ProcessGroup import create_process_group
+from .platform import system_module
+
+# Default for the 'timeout' option of the 'providers/<key>'
+# sections, in seconds.
+DEFAULT_PROVIDER_TIMEOUT = 60
 
 class AppProcess:
-	def __init__(self, appid, process):
-		if process is not Process:
+	def __init__(self, appid, process, group=None):
+		# Keep the Popen object of our own children, polling it
+		# is a single waitpid() call and reaps the zombie.
+		self.popen = process if isinstance(process, Popen) else None
+		if not isinstance(process, Process):
 			process = Process(process.pid)
 		self.appid = appid
 		self.process = process
 		self.pid = process.pid
+		# ProcessGroup the process has been started in. If this is None
+		# the process tree is walked to signal each process instead.
+		self.group = group
+		# Processes signalled by send_terminate() if there is no group
+		self._terminating = []
 		self._suspended = False
 		self._window = None
 
+	def _tree(self):
+		procs = self.process.children(recursive=True)
+		procs.append(self.process)
+		return procs
+
+	def _owns(self):
+		""" Returns a callable that tells whether a pid belongs to the app """
+		if self.group is not None:
+			return self.group.matcher()
+		return set(p.pid for p in self._tree()).__contains__
+
 	def is_running(self):
 		try:
+			if self.popen is not None and self.popen.poll() is not None:
+				return False
 			return self.process.is_running()
 		except:
 			return False
 	
 	def status(self):
 		try:
+			if self.popen is not None and self.popen.poll() is not None:
+				return STATUS_DEAD
 			return self.process.status()
 		except:
 			return STATUS_DEAD
 	
 	def is_suspended(self):
 		return self._suspended and self.is_running()
+
+	def snapshot(self):
+		""" Returns the process state as dict with the keys 'active',
+		'suspended' and 'status' using as few syscalls as possible.
+		"""
+		try:
+			if self.popen is not None:
+				# Our own child: waitpid() tells us whether it's still alive
+				running = self.popen.poll() is None
+			else:
+				running = self.process.is_running()
+			status = self.process.status() if running else STATUS_DEAD
+		except:
+			running = False
+			status = STATUS_DEAD
+		if not running and self.group is not None and self.group.is_empty():
+			self.group.release()
+		return {
+			'active': running,
+			'suspended': self._suspended and running,
+			'status': status
+		}
 	
-	def terminate(self):
+	def terminate(self, timeout=3):
 		"""Terminates the current process and all of the subprocesses.
-		If termination fails this method call falls back to kill().
+		If termination fails within 'timeout' seconds this kills the
+		processes. This blocks the caller, see ProcessTerminator for
+		a non-blocking variant.
 	
 		A suspended process will be waked before termination.
 		"""
 		try:
-			if self.is_suspended():
-				procs = self.process.children(recursive=True)
-				procs.append(self.process)
-				for p in procs:
-					LOGGER.info('Resuming child process %d before termination' % p.pid)
+			if not self.send_terminate():
+				return
+			deadline = time.monotonic() + timeout
+			while not self.terminated():
+				if time.monotonic() >= deadline:
+					self.send_kill()
+					break
+				time.sleep(0.05)
+		except:
+			LOGGER.exception('Failed to kill process %d' % self.process.pid)
+
+	def send_terminate(self):
+		""" Sends SIGTERM to the process and all of its subprocesses
+		without waiting for them. A suspended process is waked, so it
+		can handle the signal. Returns False if the process is not
+		running anymore.
+		"""
+		if self.group is not None:
+			if self.group.is_empty():
+				LOGGER.info('Process %d is not active anymore.' % self.process.pid)
+				self.group.release()
+				return False
+			LOGGER.info('Terminating %s' % self.group)
+			self.group.signal(signal.SIGTERM)
+			if self._suspended:
+				self.group.thaw()
+				self._suspended = False
+			return True
+
+		if not self.is_running():
+			LOGGER.info('Process %d is not active anymore.' % self.process.pid)
+			return False
+		self._terminating = self._tree()
+		for p in self._terminating:
+			LOGGER.info('Terminating child process %d' % p.pid)
+			try:
+				p.terminate()
+				if self._suspended:
 					p.resume()
-				
-			if self.is_running():
-				procs = self.process.children(recursive=True)
-				procs.append(self.process)
-				for p in procs:
-					LOGGER.info('Terminating child process %d' % p.pid)
-					p.terminate()
-				gone, still_alive = wait_procs(procs, timeout=3, callback=self._on_terminate)
-				for p in still_alive:
+			except NoSuchProcess:
+				pass
+		self._suspended = False
+		return True
+
+	def send_kill(self):
+		""" Kills the processes that didn't react on send_terminate() """
+		if self.group is not None:
+			LOGGER.info('Killing %s' % self.group)
+			self.group.kill()
+			return
+		for p in self._terminating:
+			try:
+				if p.is_running():
 					LOGGER.info('Killing child process %d' % p.pid)
 					p.kill()
-			else:
-				LOGGER.info('Process ' + self.process.pid + ' is not active anymore.')
-		except:
-			LOGGER.exception('Failed to kill process %d' % self.process.pid)
+			except NoSuchProcess:
+				pass
+
+	def terminated(self):
+		""" Returns True if all processes signalled by send_terminate()
+		are gone. This doesn't block.
+		"""
+		if self.popen is not None:
+			# Reap our own child, a zombie would still count as running
+			self.popen.poll()
+		if self.group is not None:
+			if not self.group.is_empty():
+				return False
+			self.group.release()
+			return True
+		(gone, alive) = wait_procs(self._terminating, timeout=0, callback=self._on_terminate)
+		self._terminating = alive
+		return len(alive) == 0
 
 	def suspend(self):
 		""" Suspends the current process and tries to retrieve
@@ -91,15 +182,17 @@ class AppProcess:
 		try:
 			if self.is_running():
 				if not self._suspended:
-					self._window = gameplay_sys.get_foreground_window()
-					procs = self.process.children(recursive=True)
-					procs.append(self.process)
-					for p in procs:
-						LOGGER.info('Suspending child process %d' % p.pid)
-						p.suspend()
+					self._window = system_module().get_foreground_window(self._owns())
+					if self.group is not None:
+						LOGGER.info('Suspending %s' % self.group)
+						self.group.freeze()
+					else:
+						for p in self._tree():
+							LOGGER.info('Suspending child process %d' % p.pid)
+							p.suspend()
 					self._suspended = True
 			else:
-				LOGGER.info('Process ' + self.process.pid + ' is not active anymore.')
+				LOGGER.info('Process %d is not active anymore.' % self.process.pid)
 			
 		except:
 			LOGGER.exception('Failed to suspend process %d' % self.process.pid)
@@ -111,14 +204,16 @@ class AppProcess:
 		try:
 			if self.is_suspended():
 				self._suspended = False
-				procs = self.process.children(recursive=True)
-				procs.append(self.process)
-				for p in procs:
-					LOGGER.info('Resuming child process %d' % p.pid)
-					p.resume()
+				if self.group is not None:
+					LOGGER.info('Resuming %s' % self.group)
+					self.group.thaw()
+				else:
+					for p in self._tree():
+						LOGGER.info('Resuming child process %d' % p.pid)
+						p.resume()
 				if self._window is not None:
 					try:
-						gameplay_sys.set_foreground_window(self._window)
+						system_module().set_foreground_window(self._window)
 					except:
 						LOGGER.exception('Failed to activate process window')
 						if raiseCallback is not None:
@@ -127,7 +222,7 @@ class AppProcess:
 					if raiseCallback is not None:
 						raiseCallback()
 			else:
-				LOGGER.info('Process ' + self.process.pid + ' is not suspended anymore.')
+				LOGGER.info('Process %d is not suspended anymore.' % self.process.pid)
 			
 		except:
 			LOGGER.exception('Failed to resume process %d' % self.process.pid)
@@ -152,12 +247,28 @@ class AppItem:
 		"""
 		if self.cmd is not None:
 			LOGGER.info('Executing command "%s"' % ' '.join(self.cmd))
-			return AppProcess(self.id, Popen(self.cmd))
+			group = create_process_group(self.id)
+			if group is None:
+				return AppProcess(self.id, Popen(self.cmd))
+			return AppProcess(self.id, group.popen(self.cmd), group)
 		return None
 
 class AppProvider:
 	def __init__(self, settings):
 		self.settings = settings
+		# Optional AppCatalog, assigned by GamePlay
+		self.catalog = None
+
+	def cached(self, section, path, func, signature=None):
+		""" Returns func(path). If an app catalog is available the
+		result is cached until the file's mtime or size changes,
+		so func must return a JSON serializable value.
+
+		See AppCatalog.get() for 'signature'.
+		"""
+		if self.catalog is None:
+			return func(path)
+		return self.catalog.cached(section, path, func, signature)
 
 	def get_apps(self):
 		""" Returns a list of AppItem objects """
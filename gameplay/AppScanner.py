@@ -0,0 +1,83 @@
+"""
+Runs the application providers concurrently.
+
+Each provider's get_apps() is executed in its own daemon thread, so
+the slowest provider doesn't block the others. A provider that does
+not finish within its timeout is abandoned: its thread keeps running
+in the background, but its result is discarded and the scan goes on
+without it.
+"""
+
+import time
+import queue
+import threading
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+class AppScanner:
+	def __init__(self):
+		# Scan threads per provider key. Used to prevent that a provider
+		# that is still busy from a previous (timed out) scan is invoked
+		# twice at the same time.
+		self._threads = {}
+
+	def scan(self, providers, timeouts, callback):
+		""" Invokes get_apps() on all providers (a dict of key => provider)
+		and calls callback(key, apps) in the calling thread as soon as a
+		result is available. If a provider fails, times out or is still
+		busy, 'apps' is None.
+
+		'timeouts' maps provider keys to timeouts in seconds. A missing
+		or non-positive value means no timeout.
+
+		Blocks until all providers have finished or timed out.
+		"""
+		results = queue.Queue()
+		deadlines = {}
+		start = time.monotonic()
+		for key, provider in providers.items():
+			thread = self._threads.get(key)
+			if thread is not None and thread.is_alive():
+				LOGGER.warning("Provider '%s' is still busy from a previous scan, skipping." % key)
+				callback(key, None)
+				continue
+
+			timeout = timeouts.get(key)
+			deadlines[key] = start + timeout if timeout and timeout > 0 else None
+			thread = threading.Thread(target=self._run, args=(key, provider, results), name='AppScanner-' + key)
+			thread.daemon = True
+			self._threads[key] = thread
+			thread.start()
+
+		pending = set(deadlines.keys())
+		while pending:
+			now = time.monotonic()
+			for key in [k for k in pending if deadlines[k] is not None and deadlines[k] <= now]:
+				LOGGER.warning("Provider '%s' did not finish within %.1f seconds, skipping." % (key, timeouts[key]))
+				pending.discard(key)
+				callback(key, None)
+			if not pending:
+				break
+
+			remaining = [deadlines[k] - now for k in pending if deadlines[k] is not None]
+			try:
+				(key, apps) = results.get(timeout=min(remaining) if remaining else None)
+			except queue.Empty:
+				continue
+
+			# Ignore late results from providers that already timed out
+			if key in pending:
+				pending.discard(key)
+				LOGGER.info("Provider '%s' returned %s apps after %.2f seconds" % (key, 'no' if apps is None else len(apps), time.monotonic() - start))
+				callback(key, apps)
+
+	def _run(self, key, provider, results):
+		apps = None
+		try:
+			apps = list(provider.get_apps())
+		except:
+			LOGGER.exception("Failed to invoke application provider %s" % provider.__class__.__name__)
+		results.put((key, apps))
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
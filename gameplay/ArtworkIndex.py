@@ -0,0 +1,112 @@
+"""
+Index of artwork files next to emulator images.
+
+Instead of probing every possible artwork filename for every image, each
+image directory is listed once and a basename -> artwork lookup table is
+built from the listing. Artwork in the subdirectories 'boxart', 'covers'
+and 'media' is found through the same table. A directory is only listed
+again if its mtime (or that of one of its artwork subdirectories) has
+changed.
+"""
+
+import os
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+# File suffixes recognized as artwork, in order of preference
+ARTWORK_SUFFIXES = ['jpeg', 'jpg', 'png', 'apng', 'gif']
+
+# Subdirectories that may contain artwork, in order of preference.
+# Artwork next to the image is preferred over these.
+ARTWORK_SUBDIRS = ['boxart', 'covers', 'media']
+
+class _Listing:
+	__slots__ = ('signature', 'subdirs', 'artwork')
+
+	def __init__(self):
+		self.signature = None
+		self.subdirs = []
+		self.artwork = {}
+
+class ArtworkIndex:
+	def __init__(self, subdirs=ARTWORK_SUBDIRS, suffixes=ARTWORK_SUFFIXES):
+		self.subdirs = subdirs
+		self.suffixes = suffixes
+		self._listings = {}
+
+	def lookup(self, path):
+		""" Returns the artwork for an image or None. Both the name without
+		the last suffix and without all suffixes are tried, e.g. for
+		'game.nes.zip' 'game.nes.png' and 'game.png'.
+		"""
+		directory = os.path.dirname(path)
+		listing = self._listings.get(directory)
+		if listing is None:
+			listing = self._list(directory)
+		name = os.path.basename(path)
+		artwork = listing.artwork.get(os.path.splitext(name)[0])
+		if artwork is None and '.' in name:
+			artwork = listing.artwork.get(name.split('.', 1)[0])
+		return artwork
+
+	def refresh(self):
+		""" Lists all known directories again whose artwork might have
+		changed. Returns the set of directories whose artwork has changed.
+		"""
+		changed = set()
+		for (directory, listing) in list(self._listings.items()):
+			if self._signature(directory, listing.subdirs) != listing.signature:
+				old = listing.artwork
+				if self._list(directory).artwork != old:
+					changed.add(directory)
+		return changed
+
+	def _signature(self, directory, subdirs):
+		signature = []
+		for path in [directory] + subdirs:
+			try:
+				signature.append(os.stat(path).st_mtime_ns)
+			except OSError:
+				signature.append(None)
+		return tuple(signature)
+
+	def _list(self, directory):
+		""" (Re-)lists a directory and its artwork subdirectories """
+		listing = _Listing()
+		found = {}
+		try:
+			for entry in os.scandir(directory):
+				if entry.is_dir():
+					if entry.name.lower() in self.subdirs:
+						listing.subdirs.append(entry.path)
+				else:
+					self._add(found, entry.name, entry.path, 0)
+		except OSError:
+			pass
+
+		listing.subdirs.sort(key=lambda path: self.subdirs.index(os.path.basename(path).lower()))
+		for (i, subdir) in enumerate(listing.subdirs):
+			try:
+				for entry in os.scandir(subdir):
+					if not entry.is_dir():
+						self._add(found, entry.name, entry.path, i + 1)
+			except OSError:
+				pass
+
+		listing.artwork = dict((name, value[2]) for (name, value) in found.items())
+		listing.signature = self._signature(directory, listing.subdirs)
+		self._listings[directory] = listing
+		return listing
+
+	def _add(self, found, filename, path, location):
+		(name, suffix) = os.path.splitext(filename)
+		suffix = suffix[1:].lower()
+		if suffix not in self.suffixes:
+			return
+		rank = (location, self.suffixes.index(suffix))
+		current = found.get(name)
+		if current is None or rank < current[0:2]:
+			found[name] = (rank[0], rank[1], path)
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
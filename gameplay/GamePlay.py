@@ -14,23 +14,21 @@ License: GPLv3
 import os
 import signal
 import logging
-import json
-import inspect
-import pkgutil
+import threading
 from urllib.parse import quote, unquote
 from subprocess import Popen
 
-from PyQt5.QtCore import QObject, pyqtSlot, QDir, QStandardPaths, QTimer
-from PyQt5.Qt import Qt
+from PyQt5.QtCore import Qt, QObject, QMetaMethod, pyqtSlot, pyqtSignal, QDir, QStandardPaths, QTimer
 
-from .AppProvider import AppProvider, AppItem
+from .AppProvider import DEFAULT_PROVIDER_TIMEOUT
+from .ProviderRegistry import ProviderRegistry
 from .GamePlayConfig import GamePlayConfig
-
-from .providers.SteamProvider import SteamProvider
-from .providers.EmulatorProvider import EmulatorProvider
-from .providers.DesktopEntryProvider import DesktopEntryProvider
-from .providers.SystemAppProvider import SystemAppProvider
-from .providers.ScummvmProvider import ScummvmProvider
+from .UiStorage import UiStorage
+from .AppCatalog import AppCatalog
+from .AppScanner import AppScanner
+from .ProcessMonitor import ProcessMonitor
+from .ProcessTerminator import ProcessTerminator
+from .ApiResources import ApiResources
 
 LOGGER = logging.getLogger(__name__)
 
@@ -134,47 +132,192 @@ class EventWrapper():
 
 class GamePlay(QObject):
 
+	# Emitted by startAppScan() with a list of new or changed apps
+	appsAdded = pyqtSignal('QVariantList')
+
+	# Emitted by startAppScan() with a list of app ids that are gone
+	appsRemoved = pyqtSignal('QVariantList')
+
+	# Emitted by startAppScan() with the changes of the app catalog,
+	# see getAppChanges()
+	appsChanged = pyqtSignal('QVariantMap')
+
+	# Emitted when the scan started by startAppScan() has been finished
+	scanFinished = pyqtSignal()
+
+	# Attributes of an AppItem that are passed to the frontend
+	APP_FIELDS = ('id', 'label', 'icon', 'icon_selected', 'categories', 'install_state')
+
+	# Emitted with the new status (see getAppStatus()) when
+	# the process status of a running app has changed.
+	appStatusChanged = pyqtSignal('QVariantMap')
+
+	# Emitted when an app stopped by stopApp() or stopAll() is gone
+	# (True) or could not be stopped (False)
+	appStopped = pyqtSignal(str, bool)
+
+	# Emitted when all apps stopped by stopAll() are done, with
+	# a map of appid => (bool) terminated.
+	allAppsStopped = pyqtSignal('QVariantMap')
+
+	# Emitted by suspendAll() with the status of the suspended apps
+	allAppsSuspended = pyqtSignal('QVariantList')
+
+	# Internal signals used to pass scan results from the
+	# scanner thread into the main thread.
+	_scanResult = pyqtSignal(str, object)
+	_scanDone = pyqtSignal()
+
 	def __init__(self):
 		# Find resource directories
 		super(GamePlay, self).__init__()
 		self.window = None
 		self.on_top = False
 		self.settings = GamePlayConfig('gameplay.ini')
-		self.ui_settings = GamePlayConfig('ui.ini')
+		self.ui_settings = UiStorage()
 		self.events = EventWrapper(self.settings)
+		self.catalog = AppCatalog()
 
-		self.providers = {
-			'steam': SteamProvider(self.settings),
-			'emulators': EmulatorProvider(self.settings),
-			'desktop': DesktopEntryProvider(self.settings),
-			'system': SystemAppProvider(self.settings),
-			'scummvm': ScummvmProvider(self.settings)
-		}
+		# Providers are imported and created when they are used first
+		self.providers = ProviderRegistry(self.settings, self.catalog)
 
 		# Currently active AppProcess object per appid.
 		self.running = {}
+		self.monitor = ProcessMonitor(self.settings.getint('frontend', 'status-interval', 250))
+		self.monitor.statusChanged.connect(self._onAppStatusChanged)
+		self.terminator = ProcessTerminator(
+				self.settings.getfloat('frontend', 'stop-timeout', 3.0),
+				self.settings.getboolean('frontend', 'stop-kill', True))
+		self.terminator.finished.connect(self._onAppStopped)
+		# Results of the running stopAll() call
+		self._stopAllResults = {}
 		self.apps = None
-	
+		self.appsByProvider = {}
+		# Catalog version, increased on every change of the app list,
+		# and (version, data) of the last change per app id. 'data'
+		# is None if the app has been removed.
+		self.appVersion = 0
+		self._appChanges = {}
+		self.scanner = AppScanner()
+		self._scanThread = None
+		self._scanResult.connect(self._onScanResult, Qt.QueuedConnection)
+		self._scanDone.connect(self._onScanDone, Qt.QueuedConnection)
+		# Served as 'gameplay://api/' by the web views
+		self.api = ApiResources(self)
+
 	def _getAppItems(self):
 		if self.apps == None:
+			self._scanApps()
+		return self.apps
+
+	def _prepareScan(self):
+		""" Returns the enabled providers and their timeouts. Apps from
+		providers that have been disabled are dropped, their ids are
+		returned as third value.
+		"""
+		providers = self.providers.enabled()
+		timeouts = {}
+		for key in providers:
+			timeouts[key] = self.settings.getfloat(self.providers.section(key), 'timeout', DEFAULT_PROVIDER_TIMEOUT)
+
+		removed = []
+		for key in list(self.appsByProvider.keys()):
+			if key not in providers:
+				removed += self._mergeApps(key, [])[1]
+				del self.appsByProvider[key]
+		return (providers, timeouts, removed)
+
+	def _mergeApps(self, key, apps):
+		""" Replaces the apps of a provider. Returns a tuple (added, removed)
+		with the new or changed apps and the ids of the apps that are gone.
+		If 'apps' is None the provider failed and nothing is changed.
+		"""
+		if apps is None:
+			return ([], [])
+
+		old = {}
+		for app in self.appsByProvider.get(key, []):
+			old[app.id] = self._appData(app)
+
+		added = []
+		ids = set()
+		for app in apps:
+			ids.add(app.id)
+			data = self._appData(app)
+			if old.get(app.id) != data:
+				added.append(data)
+		removed = [appid for appid in old if appid not in ids]
+
+		self.appsByProvider[key] = apps
+		self.apps = [app for items in self.appsByProvider.values() for app in items]
+		if added or removed:
+			self.appVersion += 1
+			for data in added:
+				self._appChanges[data['id']] = (self.appVersion, data)
+			for appid in removed:
+				self._appChanges[appid] = (self.appVersion, None)
+		return (added, removed)
+
+	def _appData(self, app):
+		""" Returns the attributes of an AppItem that are used by the frontend """
+		return dict((k, getattr(app, k)) for k in self.APP_FIELDS if hasattr(app, k))
+
+	def _emitChanges(self, added, removed):
+		if removed:
+			self.appsRemoved.emit(removed)
+		if added:
+			self.appsAdded.emit(added)
+		if added or removed:
+			self.appsChanged.emit({ 'version': self.appVersion, 'added': added, 'removed': removed })
+
+	def _scanApps(self):
+		""" Runs all enabled providers concurrently and merges their
+		results into self.apps as they arrive. If a provider fails or
+		times out the apps from its last successful scan are kept.
+		"""
+		(providers, timeouts, removed) = self._prepareScan()
+		self.apps = [app for items in self.appsByProvider.values() for app in items]
+		self.scanner.scan(providers, timeouts, self._mergeApps)
+		self.catalog.save()
+
+	@pyqtSlot()
+	def startAppScan(self):
+		""" Starts scanning for apps in a background thread and returns
+		immediately. The changes are reported by the appsChanged (and
+		appsAdded and appsRemoved) signals as soon as each provider has
+		finished, followed by scanFinished. Apps that are already known
+		from a previous scan can be fetched with getAppChanges().
+		"""
+		self.events.fire_busy()
+		if self._scanThread is not None and self._scanThread.is_alive():
+			LOGGER.info('App scan already in progress')
+			return
+
+		(providers, timeouts, removed) = self._prepareScan()
+		self._emitChanges([], removed)
+		if self.apps is None:
 			self.apps = []
-			for key, provider in self.providers.items():
-				if not self.settings.getboolean('providers/' + key, 'enabled', True):
-					LOGGER.info("Provider '%s' disabled in config file, skipping." % key)
-					continue
 
-				try:
-					for app in provider.get_apps():
-						self.apps.append(app)
-				except:
-					LOGGER.exception("Failed to invoke application provider %s" % provider.__class__.__name__)
-		return self.apps
+		def run():
+			self.scanner.scan(providers, timeouts, self._scanResult.emit)
+			self.catalog.save()
+			self._scanDone.emit()
+
+		self._scanThread = threading.Thread(target=run, name='AppScan')
+		self._scanThread.daemon = True
+		self._scanThread.start()
+
+	def _onScanResult(self, key, apps):
+		(added, removed) = self._mergeApps(key, apps)
+		self._emitChanges(added, removed)
+
+	def _onScanDone(self):
+		self.scanFinished.emit()
 
 	@pyqtSlot(str, str, str)
 	def setItem(self, section, key, value):
 		""" Set a UI storage value """
 		self.ui_settings.set(section, quote(key), value)
-		self.ui_settings.write()
 
 	@pyqtSlot(str, str, result=str)
 	def getItem(self, section, key):
@@ -189,12 +332,29 @@ class GamePlay(QObject):
 	def getOptions(self):
 		return self.settings.getall();
 
+	@pyqtSlot(int, result='QVariantMap')
+	def getAppChanges(self, since):
+		""" Returns the current catalog 'version', the apps that have been
+		added or changed after version 'since' ('added') and the ids of
+		the apps that have been removed since then ('removed'). Use 0
+		to get all apps.
+		"""
+		added = []
+		removed = []
+		for (appid, (version, data)) in self._appChanges.items():
+			if version > since:
+				if data is not None:
+					added.append(data)
+				elif since > 0:
+					removed.append(appid)
+		return { 'version': self.appVersion, 'added': added, 'removed': removed }
+
 	@pyqtSlot(result='QVariantList')
 	def getApps(self):
 		# Reset apps
 		self.events.fire_busy()
 		self.apps = None
-		return sorted([app.__dict__ for app in self._getAppItems()], key=lambda app: app['label'].lower())
+		return sorted([self._appData(app) for app in self._getAppItems()], key=lambda app: app['label'].lower())
 	
 	@pyqtSlot(str, result='QVariantMap')
 	def runApp(self, appid):
@@ -205,6 +365,7 @@ class GamePlay(QObject):
 				if p.is_suspended():
 					self.events.fire_app_resume(p)
 					p.resume(raiseCallback=self.lowerWindow)
+					self.monitor.update()
 				return self.getAppStatus(appid)
 
 		for app in self._getAppItems():
@@ -215,6 +376,7 @@ class GamePlay(QObject):
 					if p:
 						self.events.fire_app_start(p)
 						self.running[appid] = p
+						self.monitor.watch(appid, p)
 						return self.getAppStatus(appid)
 				except:
 					LOGGER.exception("Failed to run application '%s'" % appid)
@@ -226,14 +388,11 @@ class GamePlay(QObject):
 	def getAppStatus(self, appid):
 		p = self.running.get(appid)
 		if p:
-			if not p.is_running():
+			status = p.snapshot()
+			status['id'] = appid
+			if not status['active']:
 				self.events.fire_app_exit(p)
-			return {
-				'id': appid,
-				'active': p.is_running(),
-				'suspended': p.is_suspended(),
-				'status': p.status()
-			}
+			return status
 
 		return {
 			'id': appid,
@@ -246,14 +405,16 @@ class GamePlay(QObject):
 	def getAllAppStatus(self):
 		result = []
 		for appid, p in self.running.items():
-			result.append({
-				'id': appid,
-				'active': p.is_running(),
-				'suspended': p.is_suspended(),
-				'status': p.status()
-			})
+			status = p.snapshot()
+			status['id'] = appid
+			result.append(status)
 		return result
 
+	def _onAppStatusChanged(self, p, status):
+		if not status['active']:
+			self.events.fire_app_exit(p)
+		self.appStatusChanged.emit(status)
+
 	@pyqtSlot(str, result='QVariantMap')
 	def suspendApp(self, appid):
 		""" Tries to suspend an app and all of its children """
@@ -263,6 +424,7 @@ class GamePlay(QObject):
 			p.suspend()
 			self.events.fire_app_suspend(p)
 			self.raiseWindow()
+			self.monitor.update()
 		return self.getAppStatus(appid)
 
 	@pyqtSlot(str, result='QVariantMap')
@@ -274,22 +436,72 @@ class GamePlay(QObject):
 			self.suspendStayOnTop()
 			self.events.fire_app_resume(p)
 			p.resume(raiseCallback=self.lowerWindow)
+			self.monitor.update()
 		return self.getAppStatus(appid)
 
 	@pyqtSlot(str, result='QVariantMap')
 	def stopApp(self, appid):
 		""" Tries to stop the app.
 		
-		If the app doesn't terminate within 10
-		seconds this kills the application. Returns the new status.
+		This only sends SIGTERM and returns the current status. If the
+		app doesn't terminate within 'stop-timeout' seconds it is
+		killed, unless 'stop-kill' is disabled. appStopped is emitted
+		when the app is gone.
 		"""
 		self.events.fire_busy()
 		p = self.running.get(appid)
 		if p:
-			p.terminate()
-			self.raiseWindow()
+			self.terminator.stop(appid, p)
 		return self.getAppStatus(appid)
 
+	@pyqtSlot(result='QVariantList')
+	def stopAll(self):
+		""" Stops all running apps in parallel, see stopApp(). Returns
+		the ids of the apps that are stopped. allAppsStopped is emitted
+		as soon as all of them are done.
+		"""
+		self.events.fire_busy()
+		appids = [appid for (appid, p) in self.running.items() if p.is_running()]
+		if len(appids) == 0:
+			self.allAppsStopped.emit({})
+			return []
+		for appid in appids:
+			self._stopAllResults.setdefault(appid, None)
+		for appid in appids:
+			self.terminator.stop(appid, self.running[appid])
+		return appids
+
+	def _onAppStopped(self, appid, terminated):
+		self.monitor.update()
+		self.appStopped.emit(appid, terminated)
+		if appid in self._stopAllResults:
+			self._stopAllResults[appid] = terminated
+			if None not in self._stopAllResults.values():
+				results = self._stopAllResults
+				self._stopAllResults = {}
+				self.allAppsStopped.emit(results)
+		if len(self.terminator.stopping()) == 0:
+			self.raiseWindow()
+
+	@pyqtSlot(result='QVariantList')
+	def suspendAll(self):
+		""" Suspends all running apps and returns their new status.
+		allAppsSuspended is emitted with the same list.
+		"""
+		self.events.fire_busy()
+		stopping = self.terminator.stopping()
+		result = []
+		for (appid, p) in list(self.running.items()):
+			if appid not in stopping and p.is_running() and not p.is_suspended():
+				p.suspend()
+				self.events.fire_app_suspend(p)
+				result.append(self.getAppStatus(appid))
+		if len(result) > 0:
+			self.raiseWindow()
+			self.monitor.update()
+		self.allAppsSuspended.emit(result)
+		return result
+
 	@pyqtSlot()
 	def lowerWindow(self):
 		self.events.fire_busy()
@@ -322,6 +534,44 @@ class GamePlay(QObject):
 	def suspendIdle(self):
 		self.events.suspend_idle()
 	
+	# Names of the slots that may be invoked through batch()
+	_batch_methods = None
+
+	def _batchMethods(self):
+		""" Returns the names of all slots of this object except batch()
+		itself. They are read from the meta object, so every new slot
+		can be batched without further ado.
+		"""
+		if GamePlay._batch_methods is None:
+			meta = self.metaObject()
+			names = set()
+			for i in range(meta.methodOffset(), meta.methodCount()):
+				method = meta.method(i)
+				if method.methodType() == QMetaMethod.Slot:
+					names.add(method.name().data().decode('ascii'))
+			names.discard('batch')
+			GamePlay._batch_methods = frozenset(names)
+		return GamePlay._batch_methods
+
+	@pyqtSlot('QVariantList', result='QVariantList')
+	def batch(self, calls):
+		""" Invokes several slots with a single request from the frontend.
+		Each call is a list of the method name followed by its arguments.
+		Returns the list of results, None for calls that failed.
+		"""
+		results = []
+		for call in calls:
+			result = None
+			if len(call) > 0 and call[0] in self._batchMethods():
+				try:
+					result = getattr(self, call[0])(*call[1:])
+				except:
+					LOGGER.exception("Failed to invoke '%s' in batch" % call[0])
+			else:
+				LOGGER.warning("Invalid batch call: %s" % (call,))
+			results.append(result)
+		return results
+
 	def suspendStayOnTop(self):
 		if self.window is None:
 			return
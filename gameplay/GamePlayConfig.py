@@ -31,22 +31,29 @@ class GamePlayConfig:
 	"""
 
 	def __init__(self, filename):
-		self.globalConfig = configparser.ConfigParser()
-		self.localConfig = configparser.ConfigParser()
 		# FIXME Does QStandardPaths return native or unix paths?
 		self._localFile = QDir.toNativeSeparators(QStandardPaths.writableLocation(QStandardPaths.AppConfigLocation) + '/' + filename)
+		self._filename = filename
+		self.reload()
+
+	def reload(self):
+		""" (Re-)reads all configuration files """
+		self.globalConfig = configparser.ConfigParser()
+		self.localConfig = configparser.ConfigParser()
+		self._invalidate()
 
 		self.search_paths = []
 		globalPaths = QStandardPaths.standardLocations(QStandardPaths.AppConfigLocation)
 		globalPaths.append(os.path.dirname(os.path.abspath(sys.argv[0])))
 		for path in globalPaths:
-			filePath = QDir.toNativeSeparators(path + '/' + filename)
+			filePath = QDir.toNativeSeparators(path + '/' + self._filename)
 			if filePath != self._localFile:
 				self.search_paths.append(filePath)
 				if os.path.exists(filePath):
 					try:
 						LOGGER.info('Reading global config from "%s"' % filePath)
-						self.globalConfig.read_file(open(filePath))
+						with open(filePath) as f:
+							self.globalConfig.read_file(f)
 					except:
 						LOGGER.exception('Failed to parse config from "%s"' % filePath)
 
@@ -54,108 +61,108 @@ class GamePlayConfig:
 		if os.path.exists(self._localFile):
 			try:
 				LOGGER.info('Reading local config from "%s"' % self._localFile)
-				self.globalConfig.read_file(open(self._localFile))
-				self.localConfig.read_file(open(self._localFile))
+				with open(self._localFile) as f:
+					self.globalConfig.read_file(f)
+				with open(self._localFile) as f:
+					self.localConfig.read_file(f)
 			except:
 				LOGGER.exception('Failed to parse config from "%s"' % self._localFile)
-	
+
+	def _invalidate(self):
+		self._snapshot = None
+		self._typed = {}
+
+	def snapshot(self):
+		""" Returns the merged values of all configuration files as
+		dict of dicts (section => option => raw value). The result
+		is reused until set() or reload() is called and must not
+		be modified.
+		"""
+		if self._snapshot is None:
+			snapshot = {}
+			for config in [self.globalConfig, self.localConfig]:
+				for section in config.sections():
+					values = snapshot.setdefault(section, {})
+					for option in config.options(section):
+						values[option] = config.get(section, option, raw=True)
+			self._snapshot = snapshot
+		return self._snapshot
+
 	def sections(self):
-		first_list = self.globalConfig.sections()
-		second_list = self.localConfig.sections()
-		return first_list + list(set(second_list) - set(first_list))
+		return list(self.snapshot().keys())
 
 	def has_section(self, section):
-		return self.localConfig.has_section(section) or self.globalConfig.has_section(section)
+		return section in self.snapshot()
 
 	def add_section(self, section):
-		return self.localConfig.add_section(section)
+		self.localConfig.add_section(section)
+		self._invalidate()
 
 	def options(self, section):
-		first_list = self.globalConfig.options(section)
-		second_list = self.localConfig.options(section)
-		return first_list + list(set(second_list) - set(first_list))
+		return list(self.snapshot().get(section, {}).keys())
 
 	def has_option(self, section, option):
-		return self.localConfig.has_option(section, option) or self.globalConfig.has_option(section, option)
+		return self.localConfig.optionxform(option) in self.snapshot().get(section, {})
 
 	def get(self, section, option, fallback=None):
-		value = None
-		if self.localConfig.has_section(section):
-			if self.localConfig.has_option(section, option):
-				value = self.localConfig.get(section, option, raw=True)
-		if value is None:
-			if self.globalConfig.has_section(section):
-				if self.globalConfig.has_option(section, option):
-					value = self.globalConfig.get(section, option, raw=True)
+		value = self.snapshot().get(section, {}).get(self.localConfig.optionxform(option))
 		if value is None:
 			value = fallback
 		return value
 
-	def getint(self, section, option, fallback=None):
-		value = None
-		if self.localConfig.has_section(section):
-			if self.localConfig.has_option(section, option):
-				value = self.localConfig.getint(section, option, raw=True)
-		if value is None:
-			if self.globalConfig.has_section(section):
-				if self.globalConfig.has_option(section, option):
-					value = self.globalConfig.getint(section, option, raw=True)
+	def _get_typed(self, kind, convert, section, option, fallback):
+		""" Returns the converted value of an option. Conversions
+		are memoized until the snapshot is invalidated.
+		"""
+		key = (kind, section, option)
+		try:
+			value = self._typed[key]
+		except KeyError:
+			value = self.get(section, option)
+			if value is not None:
+				value = convert(value)
+			self._typed[key] = value
 		if value is None:
 			value = fallback
 		return value
-		
+
+	def getint(self, section, option, fallback=None):
+		return self._get_typed('int', int, section, option, fallback)
 
 	def getfloat(self, section, option, fallback=None):
-		value = None
-		if self.localConfig.has_section(section):
-			if self.localConfig.has_option(section, option):
-				value = self.localConfig.getfloat(section, option, raw=True)
-		if value is None:
-			if self.globalConfig.has_section(section):
-				if self.globalConfig.has_option(section, option):
-					value = self.globalConfig.getfloat(section, option, raw=True)
-		if value is None:
-			value = fallback
-		return value
+		return self._get_typed('float', float, section, option, fallback)
+
+	def _boolean(self, value):
+		if value.lower() not in self.localConfig.BOOLEAN_STATES:
+			raise ValueError('Not a boolean: %s' % value)
+		return self.localConfig.BOOLEAN_STATES[value.lower()]
 
 	def getboolean(self, section, option, fallback=None):
-		value = None
-		if self.localConfig.has_section(section):
-			if self.localConfig.has_option(section, option):
-				value = self.localConfig.getboolean(section, option, raw=True)
-		if value is None:
-			if self.globalConfig.has_section(section):
-				if self.globalConfig.has_option(section, option):
-					value = self.globalConfig.getboolean(section, option, raw=True)
-		if value is None:
-			value = fallback
-		return value
+		return self._get_typed('boolean', self._boolean, section, option, fallback)
 
 	def getlist(self, section, option, fallback=None):
-		""" Parses a value with shlex.split() """
-
-		value = self.get(section, option)
+		""" Parses a value with shlex.split(). Returns a new
+		list on each call, so callers may modify it.
+		"""
+		value = self._get_typed('list', shlex.split, section, option, None)
 		if value is not None:
-			return shlex.split(value)
+			return list(value)
 		return fallback
-	
+
 	def getall(self):
-		values = {}
-		for section in self.sections():
-			sValues = {}
-			values[section] = sValues
-			for option in self.options(section):
-				sValues[option] = self.get(section, option)
-		return values
-	
+		""" Returns the snapshot of all values, see snapshot() """
+		return self.snapshot()
+
 	def set(self, section, option, value):
 		if not self.localConfig.has_section(section):
 			self.localConfig.add_section(section)
 		self.localConfig.set(section, option, value)
-	
+		self._invalidate()
+
 	def write(self):
 		if not os.path.exists(os.path.dirname(self._localFile)):
 			os.makedirs(os.path.dirname(self._localFile))
-		self.localConfig.write(open(self._localFile, 'w'))
+		with open(self._localFile, 'w') as f:
+			self.localConfig.write(f)
 
 #  vim: set fenc=utf-8 ts=4 sw=4 noet :
@@ -0,0 +1,129 @@
+"""
+Two-tier cache for the images served by the icon:/// scheme.
+
+Resolving an icon means checking the override paths and either reading
+an image file or rasterizing a themed QIcon and encoding it as PNG. The
+IconCache keeps the results in an in-memory LRU with a byte budget.
+Results that are expensive to create can also be written to a disk
+store below the application's cache location, so they don't have to
+be encoded again on the next start.
+
+Every entry is stored together with a signature, e.g. the source file's
+mtime and size or the mtimes of the icon theme's directories. An entry
+with a different signature is treated as missing. Files on disk are
+named after the key and the signature, so files with an outdated
+signature are not used anymore and expire after DISK_MAX_AGE.
+"""
+
+import os
+import time
+import hashlib
+import threading
+import collections
+import logging
+
+from PyQt5.QtCore import QStandardPaths, QDir
+
+LOGGER = logging.getLogger(__name__)
+
+# Maximum size of all images kept in memory, in bytes
+DEFAULT_BUDGET = 32 * 1024 * 1024
+
+# Files in the disk store that haven't been used for this
+# number of seconds are removed.
+DISK_MAX_AGE = 30 * 24 * 60 * 60
+
+class IconCache:
+	def __init__(self, budget=DEFAULT_BUDGET, directory='icons'):
+		self.budget = budget
+		self._dir = QDir.toNativeSeparators(QStandardPaths.writableLocation(QStandardPaths.CacheLocation) + '/' + directory)
+		self._lock = threading.Lock()
+		# key -> (signature, (data, mimetype), size)
+		self._entries = collections.OrderedDict()
+		self._size = 0
+		self._pruned = False
+
+	def get(self, key, signature, loader, persist=False):
+		""" Returns the (data, mimetype) tuple for key. If there is no entry
+		with the same signature loader() is called and its result is
+		stored. If 'persist' is True the disk store is used as second
+		tier. Negative results (None, None) are only kept in memory.
+		"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None and entry[0] == signature:
+				self._entries.move_to_end(key)
+				return entry[1]
+
+		result = None
+		if persist:
+			result = self._read(key, signature)
+		if result is None:
+			result = loader()
+			if persist and result[0] is not None:
+				self._write(key, signature, result)
+		self._remember(key, signature, result)
+		return result
+
+	def clear(self):
+		""" Removes all entries from memory """
+		with self._lock:
+			self._entries.clear()
+			self._size = 0
+
+	def _remember(self, key, signature, result):
+		size = len(result[0]) if result[0] is not None else 0
+		if size > self.budget // 4:
+			return
+		with self._lock:
+			old = self._entries.pop(key, None)
+			if old is not None:
+				self._size -= old[2]
+			self._entries[key] = (signature, result, size)
+			self._size += size
+			while self._size > self.budget:
+				(k, old) = self._entries.popitem(last=False)
+				self._size -= old[2]
+
+	def _filename(self, key, signature):
+		digest = hashlib.sha1(repr((key, signature)).encode('UTF-8')).hexdigest()
+		return self._dir + os.sep + digest
+
+	def _read(self, key, signature):
+		filename = self._filename(key, signature)
+		try:
+			with open(filename, 'rb') as f:
+				(mimeType, data) = f.read().split(b'\n', 1)
+			# Mark the file as recently used, see _prune()
+			os.utime(filename)
+			return (data, mimeType.decode('UTF-8'))
+		except (OSError, ValueError):
+			return None
+
+	def _write(self, key, signature, result):
+		filename = self._filename(key, signature)
+		try:
+			if not os.path.exists(self._dir):
+				os.makedirs(self._dir)
+			if not self._pruned:
+				self._pruned = True
+				self._prune()
+			tmpname = '%s.%d.tmp' % (filename, threading.get_ident())
+			with open(tmpname, 'wb') as f:
+				f.write(result[1].encode('UTF-8') + b'\n')
+				f.write(result[0])
+			os.replace(tmpname, filename)
+		except OSError:
+			LOGGER.exception('Failed to write icon cache file "%s"' % filename)
+
+	def _prune(self):
+		""" Removes files that haven't been used for DISK_MAX_AGE seconds """
+		limit = time.time() - DISK_MAX_AGE
+		for entry in os.scandir(self._dir):
+			try:
+				if entry.stat().st_mtime < limit:
+					os.remove(entry.path)
+			except OSError:
+				pass
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
@@ -0,0 +1,223 @@
+"""
+In-memory index of emulator images below a set of directories.
+
+The first call to update() walks all directories once. Afterwards
+only changes are applied: on Linux the index is updated from inotify
+events (create/delete/rename), elsewhere, or if a directory cannot be
+watched, the directory's mtime is polled and only changed directories
+are listed again.
+"""
+
+import os
+import fnmatch
+import threading
+import logging
+
+from .platform import inotify
+
+LOGGER = logging.getLogger(__name__)
+
+WATCH_MASK = (inotify.IN_CREATE | inotify.IN_DELETE | inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO |
+		inotify.IN_CLOSE_WRITE | inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF | inotify.IN_ONLYDIR)
+
+class _Directory:
+	__slots__ = ('mtime', 'matches', 'subdirs', 'wd')
+
+	def __init__(self):
+		self.mtime = None
+		self.matches = set()
+		self.subdirs = set()
+		self.wd = None
+
+class ImageIndex:
+	"""
+	Keeps track of all files below 'roots' whose names match one
+	of the glob 'patterns'. Symlinked directories are not followed,
+	just like os.walk() does.
+	"""
+
+	def __init__(self, roots, patterns, watch=True):
+		self.roots = roots
+		self.patterns = patterns
+		self._lock = threading.Lock()
+		self._dirs = {}
+		self._wds = {}
+		self._files = set()
+		self._scanned = False
+		self._inotify = None
+		if watch and inotify.available():
+			try:
+				self._inotify = inotify.Inotify()
+			except OSError:
+				LOGGER.exception('Failed to initialize inotify, falling back to polling')
+
+	def files(self):
+		""" Returns the set of all currently known image paths """
+		with self._lock:
+			return set(self._files)
+
+	def update(self):
+		""" Brings the index up to date and returns a tuple of sets
+		(added, removed) with the paths that have changed since the
+		last call. A file that has been rewritten is contained in both.
+		"""
+		added = set()
+		removed = set()
+		with self._lock:
+			if not self._scanned:
+				self._scanned = True
+				for root in self.roots:
+					self._scan_dir(root, added, removed)
+			else:
+				if self._inotify is not None:
+					self._process_events(added, removed)
+				self._poll(added, removed)
+		return (added, removed)
+
+	def close(self):
+		if self._inotify is not None:
+			self._inotify.close()
+			self._inotify = None
+
+	def _matches(self, filename):
+		for pattern in self.patterns:
+			if fnmatch.fnmatch(filename, pattern):
+				return True
+		return False
+
+	def _scan_dir(self, path, added, removed):
+		""" (Re-)lists a directory and applies the difference to the index """
+		entry = self._dirs.get(path)
+		if entry is None:
+			entry = _Directory()
+			self._dirs[path] = entry
+
+		# Add the watch before listing the directory, otherwise we might miss changes
+		if self._inotify is not None and entry.wd is None:
+			try:
+				entry.wd = self._inotify.add_watch(path, WATCH_MASK)
+				self._wds[entry.wd] = path
+			except OSError as e:
+				if os.path.isdir(path):
+					LOGGER.info("Cannot watch '%s' (%s), falling back to polling" % (path, e))
+
+		try:
+			entry.mtime = os.stat(path).st_mtime_ns
+			filenames = []
+			subdirs = set()
+			for e in os.scandir(path):
+				if e.is_dir():
+					if not e.is_symlink():
+						subdirs.add(e.path)
+				else:
+					filenames.append(e.name)
+		except OSError:
+			self._remove_dir(path, removed)
+			return
+
+		matches = set()
+		for pattern in self.patterns:
+			matches.update(fnmatch.filter(filenames, pattern))
+
+		for name in matches - entry.matches:
+			self._add_file(os.path.join(path, name), added)
+		for name in entry.matches - matches:
+			self._remove_file(os.path.join(path, name), removed)
+		entry.matches = matches
+
+		old_subdirs = entry.subdirs
+		entry.subdirs = subdirs
+		for subdir in old_subdirs - subdirs:
+			self._remove_dir(subdir, removed)
+		for subdir in subdirs - old_subdirs:
+			self._scan_dir(subdir, added, removed)
+
+	def _remove_dir(self, path, removed):
+		entry = self._dirs.pop(path, None)
+		if entry is None:
+			return
+		if entry.wd is not None:
+			self._wds.pop(entry.wd, None)
+			self._inotify.rm_watch(entry.wd)
+		for name in entry.matches:
+			self._remove_file(os.path.join(path, name), removed)
+		for subdir in entry.subdirs:
+			self._remove_dir(subdir, removed)
+
+	def _add_file(self, path, added):
+		LOGGER.debug("Found image '%s'" % path)
+		self._files.add(path)
+		added.add(path)
+
+	def _remove_file(self, path, removed):
+		LOGGER.debug("Image '%s' has been removed" % path)
+		self._files.discard(path)
+		removed.add(path)
+
+	def _process_events(self, added, removed):
+		""" Applies pending inotify events """
+		for (wd, mask, cookie, name) in self._inotify.read_events():
+			if mask & inotify.IN_Q_OVERFLOW:
+				LOGGER.info('inotify queue overflow, polling all directories')
+				for entry in self._dirs.values():
+					entry.mtime = None
+				continue
+
+			path = self._wds.get(wd)
+			entry = self._dirs.get(path)
+			if entry is None:
+				continue
+
+			if mask & inotify.IN_IGNORED:
+				self._wds.pop(wd, None)
+				entry.wd = None
+				continue
+
+			if mask & (inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF):
+				if path in self.roots:
+					self._remove_dir(path, removed)
+				continue
+
+			fullpath = os.path.join(path, name)
+			if mask & inotify.IN_ISDIR:
+				if mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+					if fullpath not in entry.subdirs:
+						entry.subdirs.add(fullpath)
+						self._scan_dir(fullpath, added, removed)
+				elif mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+					entry.subdirs.discard(fullpath)
+					self._remove_dir(fullpath, removed)
+			elif mask & (inotify.IN_CREATE | inotify.IN_MOVED_TO):
+				if name not in entry.matches and self._matches(name):
+					entry.matches.add(name)
+					self._add_file(fullpath, added)
+			elif mask & (inotify.IN_DELETE | inotify.IN_MOVED_FROM):
+				if name in entry.matches:
+					entry.matches.discard(name)
+					self._remove_file(fullpath, removed)
+			elif mask & inotify.IN_CLOSE_WRITE:
+				if name in entry.matches:
+					# Content changed, report as removed and added again
+					self._remove_file(fullpath, removed)
+					self._add_file(fullpath, added)
+
+	def _poll(self, added, removed):
+		""" Checks unwatched directories (and roots that did not exist yet)
+		for mtime changes and lists them again if necessary.
+		"""
+		for root in self.roots:
+			if root not in self._dirs and os.path.isdir(root):
+				self._scan_dir(root, added, removed)
+
+		for path in list(self._dirs.keys()):
+			entry = self._dirs.get(path)
+			if entry is None or (entry.wd is not None and entry.mtime is not None):
+				continue
+			try:
+				mtime = os.stat(path).st_mtime_ns
+			except OSError:
+				mtime = None
+			if mtime is None or mtime != entry.mtime:
+				self._scan_dir(path, added, removed)
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
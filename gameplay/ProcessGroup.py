@@ -0,0 +1,244 @@
+"""
+Groups the process tree of a launched app, so that it can be suspended,
+resumed and terminated as a whole.
+
+On Linux with cgroup v2 each app is started in its own child cgroup of
+our own (delegated) cgroup. Suspending and resuming is a single write to
+'cgroup.freeze' and killing is a single write to 'cgroup.kill', so no
+process of the tree can escape by forking in between.
+
+Otherwise the app is started in a new session and thus in a process
+group of its own, which is signalled with killpg(). Processes that
+start a session of their own are not covered by this.
+
+create_process_group() returns None on systems that support neither,
+the caller has to fall back to walking the process tree then.
+"""
+
+import os
+import re
+import sys
+import signal
+import logging
+import itertools
+
+from subprocess import Popen, PIPE, DEVNULL, TimeoutExpired
+
+LOGGER = logging.getLogger(__name__)
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# Joins the cgroup "$1" and executes the remaining arguments. Exits with
+# 126 (cannot execute) if the cgroup cannot be joined, which is checked
+# with _probe_cgroup() before the first app is started in a cgroup.
+JOIN_CGROUP = 'echo 0 > "$1/cgroup.procs" || exit 126; shift; exec "$@"'
+
+_counter = itertools.count(1)
+
+class ProcessGroup:
+	""" The process group of a new session """
+
+	def __init__(self):
+		self.pgid = None
+
+	def popen(self, cmd, **kwargs):
+		""" Starts 'cmd' in this group and returns the Popen object """
+		popen = Popen(cmd, start_new_session=True, **kwargs)
+		self.pgid = popen.pid
+		return popen
+
+	def freeze(self):
+		os.killpg(self.pgid, signal.SIGSTOP)
+
+	def thaw(self):
+		os.killpg(self.pgid, signal.SIGCONT)
+
+	def signal(self, sig):
+		""" Sends 'sig' to all processes of the group """
+		try:
+			os.killpg(self.pgid, sig)
+		except ProcessLookupError:
+			pass
+
+	def kill(self):
+		self.signal(signal.SIGKILL)
+
+	def contains(self, pid):
+		""" Returns True if the process 'pid' belongs to the group """
+		try:
+			return os.getpgid(pid) == self.pgid
+		except OSError:
+			return False
+
+	def matcher(self):
+		""" Returns a callable that works like contains() for repeated
+		lookups, e.g. one per window.
+		"""
+		return self.contains
+
+	def is_empty(self):
+		try:
+			os.killpg(self.pgid, 0)
+			return False
+		except ProcessLookupError:
+			return True
+		except PermissionError:
+			return False
+
+	def release(self):
+		""" Frees the resources of an empty group """
+		pass
+
+	def __str__(self):
+		return 'process group %s' % self.pgid
+
+class CgroupProcessGroup(ProcessGroup):
+	""" A child cgroup (v2) of our own cgroup """
+
+	def __init__(self, path):
+		self.path = path
+
+	def popen(self, cmd, **kwargs):
+		# A shell moves itself into the cgroup and replaces itself with
+		# the command. preexec_fn would run Python code between fork()
+		# and exec(), which may deadlock while other threads are running.
+		try:
+			return Popen(['/bin/sh', '-c', JOIN_CGROUP, 'sh', self.path] + list(cmd), **kwargs)
+		except:
+			self.release()
+			raise
+
+	def _write(self, name, value):
+		with open(os.path.join(self.path, name), 'w') as f:
+			f.write(value)
+
+	def freeze(self):
+		self._write('cgroup.freeze', '1')
+
+	def thaw(self):
+		self._write('cgroup.freeze', '0')
+
+	def pids(self):
+		try:
+			with open(os.path.join(self.path, 'cgroup.procs')) as f:
+				return [int(line) for line in f if line.strip()]
+		except FileNotFoundError:
+			return []
+
+	def contains(self, pid):
+		return pid in self.pids()
+
+	def matcher(self):
+		# Reads cgroup.procs once instead of once per lookup
+		return frozenset(self.pids()).__contains__
+
+	def signal(self, sig):
+		for pid in self.pids():
+			try:
+				os.kill(pid, sig)
+			except ProcessLookupError:
+				pass
+
+	def kill(self):
+		try:
+			self._write('cgroup.kill', '1')
+		except FileNotFoundError:
+			# cgroup.kill requires Linux 5.14, freeze the group to
+			# prevent forks while the processes are killed one by one
+			self.freeze()
+			self.signal(signal.SIGKILL)
+			self.thaw()
+
+	def is_empty(self):
+		try:
+			with open(os.path.join(self.path, 'cgroup.events')) as f:
+				for line in f:
+					if line.startswith('populated '):
+						return line.split()[1] == '0'
+		except FileNotFoundError:
+			return True
+		return False
+
+	def release(self):
+		try:
+			os.rmdir(self.path)
+		except FileNotFoundError:
+			pass
+		except OSError as e:
+			LOGGER.debug('Failed to remove cgroup %s: %s' % (self.path, e))
+
+	def __str__(self):
+		return 'cgroup %s' % self.path
+
+def _own_cgroup():
+	""" Returns the path of our own cgroup v2 or None """
+	if not os.path.exists(os.path.join(CGROUP_ROOT, 'cgroup.controllers')):
+		return None
+	try:
+		with open('/proc/self/cgroup') as f:
+			for line in f:
+				if line.startswith('0::'):
+					path = os.path.join(CGROUP_ROOT, line[3:].strip().lstrip('/'))
+					return path if os.path.isdir(path) else None
+	except OSError:
+		pass
+	return None
+
+_cgroup_available = None
+
+def _create_cgroup(name):
+	global _cgroup_available
+	if _cgroup_available is False:
+		return None
+	parent = _own_cgroup()
+	if parent is None or not os.access(os.path.join(parent, 'cgroup.procs'), os.W_OK):
+		if _cgroup_available is None:
+			LOGGER.info('cgroup v2 is not available or not delegated, using process groups')
+		_cgroup_available = False
+		return None
+
+	path = os.path.join(parent, 'gameplay-%s-%d-%d' % (re.sub(r'[^A-Za-z0-9_.-]', '_', name), os.getpid(), next(_counter)))
+	try:
+		os.mkdir(path)
+	except OSError as e:
+		LOGGER.info('Failed to create cgroup %s, using process groups: %s' % (path, e))
+		_cgroup_available = False
+		return None
+	group = CgroupProcessGroup(path)
+	if _cgroup_available is None:
+		error = _probe_cgroup(group)
+		if error is not None:
+			LOGGER.info('Cannot join cgroup %s, using process groups: %s' % (path, error))
+			group.release()
+			_cgroup_available = False
+			return None
+	_cgroup_available = True
+	return group
+
+def _probe_cgroup(group):
+	""" Starts a process that joins the cgroup and exits immediately.
+	Joining fails e.g. with EBUSY or EACCES if the hierarchy is only
+	partially delegated. Returns None on success or the error message.
+	"""
+	try:
+		p = group.popen(['true'], stdout=DEVNULL, stderr=PIPE)
+		(out, err) = p.communicate(timeout=5)
+	except (OSError, TimeoutExpired) as e:
+		return str(e)
+	if p.returncode != 0:
+		return err.decode('UTF-8', 'replace').strip() or 'exit status %d' % p.returncode
+	return None
+
+def create_process_group(name):
+	""" Returns a new ProcessGroup for the app 'name', or None
+	if the system doesn't support process groups.
+	"""
+	if not hasattr(os, 'killpg'):
+		return None
+	if sys.platform.startswith('linux'):
+		group = _create_cgroup(name)
+		if group is not None:
+			return group
+	return ProcessGroup()
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
@@ -0,0 +1,64 @@
+"""
+Watches the processes of running apps and reports status changes.
+
+Instead of letting the frontend poll the status of every app, all
+watched processes are sampled in a single timer callback and a signal
+is only emitted if an app's status has actually changed. The timer
+is stopped as soon as no watched app is running anymore.
+"""
+
+import logging
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+LOGGER = logging.getLogger(__name__)
+
+class ProcessMonitor(QObject):
+
+	# Emitted with the AppProcess and its new status
+	# (see AppProcess.snapshot()) including the app's 'id'.
+	statusChanged = pyqtSignal(object, dict)
+
+	def __init__(self, interval=250):
+		super(ProcessMonitor, self).__init__()
+		self._processes = {}
+		self._status = {}
+		# Incremented whenever statusChanged is emitted
+		self.version = 0
+		self.timer = QTimer(self)
+		self.timer.setInterval(interval)
+		self.timer.timeout.connect(self.update)
+
+	def watch(self, appid, process):
+		""" Starts watching an AppProcess and reports its current status """
+		self._processes[appid] = process
+		self._status.pop(appid, None)
+		self.update()
+
+	def status(self, appid):
+		""" Returns the last known status of an app or None """
+		return self._status.get(appid)
+
+	def update(self):
+		""" Samples all watched processes and emits statusChanged for
+		every app whose status differs from the last sample. Processes
+		that are not active anymore are not watched any longer.
+		"""
+		for appid, process in list(self._processes.items()):
+			status = process.snapshot()
+			status['id'] = appid
+			if status != self._status.get(appid):
+				self._status[appid] = status
+				self.version += 1
+				self.statusChanged.emit(process, status)
+			if not status['active']:
+				LOGGER.info("App '%s' is not running anymore" % appid)
+				del self._processes[appid]
+
+		if len(self._processes) > 0:
+			if not self.timer.isActive():
+				self.timer.start()
+		else:
+			self.timer.stop()
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
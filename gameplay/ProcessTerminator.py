@@ -0,0 +1,93 @@
+"""
+Terminates apps without blocking the event loop.
+
+Each app passes through the states 'terminating' (SIGTERM has been
+sent, waiting for the grace period) and 'killing' (SIGKILL has been
+sent). All pending apps are checked in a single timer callback, so
+any number of apps can be stopped in parallel.
+
+The escalation is configured in the [frontend] section of gameplay.ini:
+'stop-timeout' is the grace period in seconds and 'stop-kill' decides
+whether the remaining processes are killed afterwards.
+"""
+
+import time
+import logging
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+LOGGER = logging.getLogger(__name__)
+
+STATE_TERMINATING = 'terminating'
+STATE_KILLING = 'killing'
+
+# Seconds to wait for the processes to disappear after SIGKILL
+KILL_TIMEOUT = 2.0
+
+class ProcessTerminator(QObject):
+
+	# Emitted with the app's id and whether all of
+	# its processes have been terminated.
+	finished = pyqtSignal(str, bool)
+
+	def __init__(self, timeout=3.0, kill=True, interval=100):
+		super(ProcessTerminator, self).__init__()
+		self.timeout = timeout
+		self.kill = kill
+		# appid => [AppProcess, state, deadline]
+		self._pending = {}
+		self.timer = QTimer(self)
+		self.timer.setInterval(interval)
+		self.timer.timeout.connect(self.update)
+
+	def stopping(self):
+		""" Returns the ids of the apps that are being stopped """
+		return list(self._pending.keys())
+
+	def stop(self, appid, process):
+		""" Sends SIGTERM to an AppProcess. 'finished' is emitted as
+		soon as the process is gone or the escalation has failed.
+		"""
+		if appid in self._pending:
+			return
+		try:
+			running = process.send_terminate()
+		except:
+			LOGGER.exception("Failed to terminate app '%s'" % appid)
+			running = True
+		if not running:
+			self.finished.emit(appid, True)
+			return
+		self._pending[appid] = [process, STATE_TERMINATING, time.monotonic() + self.timeout]
+		if not self.timer.isActive():
+			self.timer.start()
+
+	def update(self):
+		""" Advances the state of all pending apps """
+		now = time.monotonic()
+		for appid, entry in list(self._pending.items()):
+			(process, state, deadline) = entry
+			try:
+				if process.terminated():
+					self._finish(appid, True)
+				elif now >= deadline:
+					if state == STATE_TERMINATING and self.kill:
+						LOGGER.info("App '%s' did not terminate within %.1f seconds" % (appid, self.timeout))
+						process.send_kill()
+						entry[1] = STATE_KILLING
+						entry[2] = now + KILL_TIMEOUT
+					else:
+						LOGGER.warning("Failed to stop app '%s'" % appid)
+						self._finish(appid, False)
+			except:
+				LOGGER.exception("Failed to stop app '%s'" % appid)
+				self._finish(appid, False)
+
+		if len(self._pending) == 0:
+			self.timer.stop()
+
+	def _finish(self, appid, terminated):
+		del self._pending[appid]
+		self.finished.emit(appid, terminated)
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
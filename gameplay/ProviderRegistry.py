@@ -0,0 +1,151 @@
+"""
+Registry of the application providers.
+
+Providers are registered by key together with the 'module:Class' name of
+their implementation and the section in gameplay.ini that configures
+them. A provider's module is only imported and the provider is only
+created when it is used for the first time, so disabled providers cost
+nothing on startup.
+
+Besides the built-in providers, third-party packages can register
+providers with an entry point in the group 'gameplay.providers':
+
+	entry_points={
+		'gameplay.providers': ['myprovider = mypackage.provider:MyProvider']
+	}
+
+The provider is configured in the section 'providers/myprovider'. Its
+class is constructed with the GamePlayConfig of gameplay.ini and must
+implement AppProvider. Since looking up entry points reads the metadata
+of all installed packages, this can be disabled with 'entry-points =
+false' in the [providers] section.
+"""
+
+import logging
+import importlib
+
+from .profiling import measure
+
+LOGGER = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = 'gameplay.providers'
+
+# (key, implementation, config section)
+BUILTIN_PROVIDERS = [
+	('steam', 'gameplay.providers.SteamProvider:SteamProvider', 'providers/steam'),
+	('emulators', 'gameplay.providers.EmulatorProvider:EmulatorProvider', 'providers/emulator'),
+	('desktop', 'gameplay.providers.DesktopEntryProvider:DesktopEntryProvider', 'providers/desktop'),
+	('system', 'gameplay.providers.SystemAppProvider:SystemAppProvider', 'providers/system'),
+	('scummvm', 'gameplay.providers.ScummvmProvider:ScummvmProvider', 'providers/scummvm')
+]
+
+def _entry_points():
+	""" Returns the (name, value) of the entry points in ENTRY_POINT_GROUP """
+	try:
+		from importlib import metadata
+	except ImportError:
+		return []
+	try:
+		eps = metadata.entry_points()
+		if hasattr(eps, 'select'):
+			eps = eps.select(group=ENTRY_POINT_GROUP)
+		else:
+			eps = eps.get(ENTRY_POINT_GROUP, [])
+		return [(ep.name, ep.value) for ep in eps]
+	except:
+		LOGGER.exception('Failed to read entry points of %s' % ENTRY_POINT_GROUP)
+		return []
+
+class ProviderRegistry:
+	def __init__(self, settings, catalog=None):
+		self.settings = settings
+		# Optional AppCatalog assigned to each provider
+		self.catalog = catalog
+		self._specs = None
+		self._providers = {}
+		self._failed = set()
+
+	def _registry(self):
+		if self._specs is None:
+			with measure('discover providers'):
+				specs = {}
+				for (key, target, section) in BUILTIN_PROVIDERS:
+					specs[key] = (target, section)
+				plugins = _entry_points() if self.settings.getboolean('providers', 'entry-points', True) else []
+				for (key, target) in plugins:
+					if key in specs:
+						LOGGER.warning("Ignoring provider '%s' from '%s', the name is already taken" % (key, target))
+						continue
+					LOGGER.info("Found provider '%s' (%s)" % (key, target))
+					specs[key] = (target, 'providers/' + key)
+				self._specs = specs
+		return self._specs
+
+	def register(self, key, target, section=None):
+		""" Registers a provider. 'target' is either the 'module:Class'
+		name of its implementation or a callable that takes the settings
+		and returns the provider.
+		"""
+		self._registry()[key] = (target, section or 'providers/' + key)
+		self._providers.pop(key, None)
+		self._failed.discard(key)
+
+	def keys(self):
+		return list(self._registry().keys())
+
+	def section(self, key):
+		""" Returns the name of the provider's section in gameplay.ini """
+		return self._registry()[key][1]
+
+	def is_enabled(self, key):
+		return self.settings.getboolean(self.section(key), 'enabled', True)
+
+	def get(self, key):
+		""" Returns the provider, which is created on first use. Returns
+		None if the provider is unknown or failed to load.
+		"""
+		provider = self._providers.get(key)
+		if provider is not None or key in self._failed:
+			return provider
+		spec = self._registry().get(key)
+		if spec is None:
+			return None
+
+		target = spec[0]
+		try:
+			with measure("provider '%s'" % key):
+				if isinstance(target, str):
+					(module, name) = target.split(':', 1)
+					target = getattr(importlib.import_module(module), name)
+				provider = target(self.settings)
+				provider.catalog = self.catalog
+		except:
+			LOGGER.exception("Failed to load provider '%s'" % key)
+			self._failed.add(key)
+			return None
+		self._providers[key] = provider
+		return provider
+
+	def __getitem__(self, key):
+		provider = self.get(key)
+		if provider is None:
+			raise KeyError(key)
+		return provider
+
+	def enabled(self):
+		""" Returns a dict of key => provider with all enabled providers """
+		providers = {}
+		for key in self.keys():
+			if not self.is_enabled(key):
+				LOGGER.info("Provider '%s' disabled in config file, skipping." % key)
+				continue
+			provider = self.get(key)
+			if provider is not None:
+				providers[key] = provider
+		return providers
+
+	def items(self):
+		""" Returns (key, provider) for all providers, including the disabled ones """
+		return [(key, self.get(key)) for key in self.keys() if self.get(key) is not None]
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
@@ -0,0 +1,110 @@
+"""
+Key-value storage for the UI (favourites, hidden apps, gamepad mappings).
+
+Values are kept in memory and written to a SQLite database in WAL mode.
+Writes are coalesced: set() only marks a value as modified and all
+modifications are flushed in a single transaction after a short delay
+or when the application exits.
+
+On first start the values of the former 'ui.ini' are imported.
+"""
+
+import os
+import atexit
+import sqlite3
+import threading
+import logging
+
+from PyQt5.QtCore import QObject, QTimer, QStandardPaths, QDir
+
+from .GamePlayConfig import GamePlayConfig
+
+LOGGER = logging.getLogger(__name__)
+
+class UiStorage(QObject):
+	def __init__(self, filename='ui.sqlite', legacy='ui.ini', delay=1000):
+		super(UiStorage, self).__init__()
+		self._file = QDir.toNativeSeparators(QStandardPaths.writableLocation(QStandardPaths.AppDataLocation) + '/' + filename)
+		self._lock = threading.Lock()
+		self._values = {}
+		self._dirty = set()
+		self._db = None
+		self.timer = QTimer(self)
+		self.timer.setSingleShot(True)
+		self.timer.setInterval(delay)
+		self.timer.timeout.connect(self.flush)
+		self._open(legacy)
+		atexit.register(self.flush)
+
+	def _normalize(self, key):
+		# Keys have been lowercased by configparser in 'ui.ini'
+		return key.lower()
+
+	def _open(self, legacy):
+		try:
+			if not os.path.exists(os.path.dirname(self._file)):
+				os.makedirs(os.path.dirname(self._file))
+			db = sqlite3.connect(self._file, check_same_thread=False)
+			db.execute('PRAGMA journal_mode=WAL')
+			db.execute('PRAGMA synchronous=NORMAL')
+			db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+			db.execute('CREATE TABLE IF NOT EXISTS items (section TEXT, key TEXT, value TEXT, PRIMARY KEY (section, key))')
+			for (section, key, value) in db.execute('SELECT section, key, value FROM items'):
+				self._values[(section, key)] = value
+			self._db = db
+			if db.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone() is None:
+				self._migrate(legacy)
+		except:
+			LOGGER.exception('Failed to open UI storage "%s", changes will not be saved' % self._file)
+
+	def _migrate(self, legacy):
+		""" Imports all values from the former ini file. The values and
+		the 'migrated' marker are written in the same transaction, so the
+		import is repeated if it didn't complete.
+		"""
+		config = GamePlayConfig(legacy)
+		values = config.getall()
+		rows = []
+		with self._lock:
+			for (section, options) in values.items():
+				for (key, value) in options.items():
+					key = (section, self._normalize(key))
+					self._values.setdefault(key, value)
+					rows.append((key[0], key[1], self._values[key]))
+		with self._db:
+			self._db.executemany('INSERT OR REPLACE INTO items (section, key, value) VALUES (?, ?, ?)', rows)
+			self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated', ?)", (legacy,))
+		if len(values) > 0:
+			LOGGER.info('Imported UI settings from "%s"' % legacy)
+
+	def get(self, section, key, fallback=None):
+		with self._lock:
+			return self._values.get((section, self._normalize(key)), fallback)
+
+	def set(self, section, key, value):
+		""" Stores a value. It is written to disk after a short delay. """
+		key = (section, self._normalize(key))
+		with self._lock:
+			if self._values.get(key) == value:
+				return
+			self._values[key] = value
+			self._dirty.add(key)
+		if not self.timer.isActive():
+			self.timer.start()
+
+	def flush(self):
+		""" Writes all modified values in a single transaction """
+		with self._lock:
+			if self._db is None or len(self._dirty) == 0:
+				return
+			rows = [(k[0], k[1], self._values[k]) for k in self._dirty]
+			self._dirty = set()
+		try:
+			with self._db:
+				self._db.executemany('INSERT OR REPLACE INTO items (section, key, value) VALUES (?, ?, ?)', rows)
+		except:
+			LOGGER.exception('Failed to save UI storage to "%s"' % self._file)
+			with self._lock:
+				self._dirty.update((row[0], row[1]) for row in rows)
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
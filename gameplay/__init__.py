@@ -1,5 +1,19 @@
-from .GamePlay import GamePlay
-from .Frontend import Frontend
-from .AppProvider import AppProvider, AppItem
+import importlib
+
+# The exported classes are imported on first access (which requires
+# Python 3.7), so that importing a module of this package (like
+# 'gameplay.profiling') stays cheap and doesn't pull in PyQt5 or psutil.
+_LAZY_EXPORTS = {
+	'AppProvider': '.AppProvider',
+	'AppItem': '.AppProvider',
+	'GamePlay': '.GamePlay',
+	'Frontend': '.Frontend'
+}
+
+def __getattr__(name):
+	module = _LAZY_EXPORTS.get(name)
+	if module is None:
+		raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+	return getattr(importlib.import_module(module, __name__), name)
 
 #  vim: set fenc=utf-8 ts=4 sw=4 noet :
@@ -0,0 +1,121 @@
+"""
+Streaming reader for freedesktop.org .desktop files.
+
+Only the [Desktop Entry] group and the [Desktop Action ...] groups the
+caller is interested in are parsed. Reading stops as soon as these have
+been seen, so most files are not read to the end.
+
+See https://specifications.freedesktop.org/desktop-entry-spec/latest/
+"""
+
+_ESCAPES = { 's': ' ', 'n': '\n', 't': '\t', 'r': '\r', '\\': '\\' }
+
+DESKTOP_ENTRY = 'Desktop Entry'
+
+def unescape(value):
+	""" Replaces the escape sequences \\s, \\n, \\t, \\r and \\\\ """
+	if '\\' not in value:
+		return value
+	result = []
+	i = 0
+	while i < len(value):
+		c = value[i]
+		if c == '\\' and i + 1 < len(value):
+			i += 1
+			c = _ESCAPES.get(value[i], '\\' + value[i])
+		result.append(c)
+		i += 1
+	return ''.join(result)
+
+def split_list(value):
+	""" Splits a list of strings separated by unescaped semicolons
+	and unescapes the items. Empty items are dropped.
+	"""
+	items = []
+	current = []
+	i = 0
+	while i < len(value):
+		c = value[i]
+		if c == '\\' and i + 1 < len(value):
+			if value[i + 1] == ';':
+				current.append(';')
+			else:
+				current.append(value[i:i + 2])
+			i += 2
+			continue
+		if c == ';':
+			items.append(unescape(''.join(current)))
+			current = []
+		else:
+			current.append(c)
+		i += 1
+	items.append(unescape(''.join(current)))
+	return [x for x in items if x]
+
+def locale_keys(name):
+	""" Returns the locale suffixes that match a locale name like
+	'de_DE.UTF-8@euro' in order of preference, e.g. 'de_DE@euro',
+	'de_DE', 'de@euro' and 'de'.
+	"""
+	if not name:
+		return []
+	modifier = ''
+	if '@' in name:
+		(name, modifier) = name.split('@', 1)
+		modifier = '@' + modifier
+	name = name.split('.', 1)[0]
+	lang = name.split('_', 1)[0]
+	keys = []
+	for key in [name + modifier, name, lang + modifier, lang]:
+		if key and key not in keys:
+			keys.append(key)
+	return keys
+
+def localized(values, key, locales):
+	""" Returns the value of 'key[locale]' for the first matching
+	locale of 'locales' (see locale_keys()) or that of 'key'.
+	"""
+	for locale in locales:
+		value = values.get('%s[%s]' % (key, locale))
+		if value is not None:
+			return value
+	return values.get(key)
+
+def read_entry(fp, actions=()):
+	""" Reads the [Desktop Entry] group and the [Desktop Action <name>]
+	groups for those 'actions' that are listed in the entry's 'Actions'
+	key. Returns a dict that maps group names to dicts of raw values,
+	or None if the file doesn't start with a [Desktop Entry] group.
+	"""
+	groups = {}
+	group = None
+	pending = None
+	for line in fp:
+		line = line.strip()
+		if not line or line[0] == '#':
+			continue
+
+		if line[0] == '[' and line[-1] == ']':
+			if group is None and line != '[' + DESKTOP_ENTRY + ']':
+				return None
+			if group == DESKTOP_ENTRY:
+				listed = split_list(groups[DESKTOP_ENTRY].get('Actions', ''))
+				pending = set('Desktop Action ' + action for action in actions if action in listed)
+			elif group is not None:
+				pending.discard(group)
+			if pending is not None and len(pending) == 0:
+				break
+			group = line[1:-1]
+			if group == DESKTOP_ENTRY or (pending is not None and group in pending):
+				groups.setdefault(group, {})
+			continue
+
+		if group is None:
+			return None
+		values = groups.get(group)
+		if values is not None and '=' in line:
+			(key, value) = line.split('=', 1)
+			values.setdefault(key.rstrip(), value.lstrip())
+	return groups if DESKTOP_ENTRY in groups else None
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
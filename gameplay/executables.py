@@ -0,0 +1,104 @@
+"""
+Process-wide lookup of executables in $PATH.
+
+QStandardPaths.findExecutable() stats every $PATH directory for each
+lookup. Since the providers resolve thousands of commands per scan, the
+contents of each $PATH directory are listed once into a set instead.
+A directory is listed again when its mtime changes, which is checked at
+most once every CHECK_INTERVAL seconds.
+"""
+
+import os
+import sys
+import time
+import threading
+
+# Minimum time in seconds between two mtime checks of a directory
+CHECK_INTERVAL = 2.0
+
+_WINDOWS = sys.platform.startswith('win')
+
+class _Directory:
+	__slots__ = ('mtime', 'checked', 'names')
+
+	def __init__(self):
+		self.mtime = None
+		self.checked = 0
+		self.names = frozenset()
+
+_lock = threading.Lock()
+_directories = {}
+
+def _normcase(name):
+	return name.lower() if _WINDOWS else name
+
+def _names(directory):
+	""" Returns the (normalized) filenames in a directory """
+	now = time.monotonic()
+	with _lock:
+		entry = _directories.get(directory)
+		if entry is None:
+			entry = _Directory()
+			_directories[directory] = entry
+		elif now - entry.checked < CHECK_INTERVAL:
+			return entry.names
+
+	try:
+		mtime = os.stat(directory).st_mtime_ns
+	except OSError:
+		mtime = None
+	if mtime != entry.mtime:
+		names = set()
+		if mtime is not None:
+			try:
+				for e in os.scandir(directory):
+					if not e.is_dir():
+						names.add(_normcase(e.name))
+			except OSError:
+				pass
+		entry.names = frozenset(names)
+		entry.mtime = mtime
+	entry.checked = now
+	return entry.names
+
+def _is_executable(path):
+	return os.path.isfile(path) and (_WINDOWS or os.access(path, os.X_OK))
+
+def _candidates(name):
+	""" On Windows 'name' may omit one of the suffixes in %PATHEXT% """
+	if not _WINDOWS:
+		return [name]
+	suffixes = [s.lower() for s in os.environ.get('PATHEXT', '.COM;.EXE;.BAT;.CMD').split(os.pathsep) if s]
+	if os.path.splitext(name)[1].lower() in suffixes:
+		return [name]
+	return [name] + [name + suffix for suffix in suffixes]
+
+def find_executable(name, paths=None):
+	""" Returns the absolute path of the executable 'name' or an empty
+	string, just like QStandardPaths.findExecutable(). 'paths' defaults
+	to the directories in $PATH. Names that contain a directory are
+	only checked for existence.
+	"""
+	if not name:
+		return ''
+	if os.path.dirname(name):
+		for candidate in _candidates(name):
+			if _is_executable(candidate):
+				return os.path.abspath(candidate)
+		return ''
+
+	if paths is None:
+		paths = os.environ.get('PATH', '').split(os.pathsep)
+	candidates = _candidates(name)
+	for directory in paths:
+		if not directory:
+			continue
+		names = _names(directory)
+		for candidate in candidates:
+			if _normcase(candidate) in names:
+				path = os.path.join(directory, candidate)
+				if _is_executable(path):
+					return os.path.abspath(path)
+	return ''
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
@@ -0,0 +1,315 @@
+"""
+Image info handlers for the emulator provider.
+
+An image info handler takes the path of an emulator image and returns
+a (label, icon) tuple. Handlers are registered by name and selected
+per emulator with the 'image-info-handler' option in 'emulators.ini'.
+A handler may also provide a batch function that processes a list of
+images at once, e.g. with a single call of an external program.
+
+Besides the 'filename' and 'wit' handlers this module contains readers
+for the headers of common disc and cartridge formats. They only read
+the few bytes they need from the image and fall back to the 'filename'
+handler if an image is not recognized.
+"""
+
+import os
+import zlib
+import struct
+import logging
+import subprocess
+import configparser
+
+from PyQt5.QtCore import QFileInfo, QDir
+
+from .executables import find_executable
+
+LOGGER = logging.getLogger(__name__)
+
+_HANDLERS = {}
+
+def register_image_info_handler(name, handler, batch=None):
+	""" Makes a handler available as 'image-info-handler'
+	in 'emulators.ini'. Existing handlers are replaced.
+
+	'batch' is an optional function that takes a list of paths
+	and returns a list of (label, icon) tuples in the same order.
+	"""
+	_HANDLERS[name] = (handler, batch)
+
+def get_image_info_handler(name):
+	""" Returns the handler registered as 'name' or None """
+	entry = _HANDLERS.get(name)
+	return entry[0] if entry is not None else None
+
+def get_image_info_batch_handler(name):
+	""" Returns the batch function of the handler registered as 'name'.
+	If the handler has none the paths are processed one by one.
+	"""
+	entry = _HANDLERS.get(name)
+	if entry is None:
+		return None
+	if entry[1] is not None:
+		return entry[1]
+	handler = entry[0]
+	return lambda paths: [handler(path) for path in paths]
+
+def image_info_handler_names():
+	return sorted(_HANDLERS.keys())
+
+def filename_image_info_handler(path):
+	""" Uses the basename (without suffix and underscores
+	replaced with spaces) for 'name'. Artwork next to the
+	image is resolved by the emulator's ArtworkIndex.
+	"""
+	basename = QFileInfo(path).completeBaseName()
+	return (basename.replace('_', ' '), None)
+
+def _find_wit():
+	executable = find_executable('wit') or find_executable('wit.exe')
+	return QDir.toNativeSeparators(executable) if executable else None
+
+def _wit_disc_info(conf, section, label, icon):
+	""" Applies a 'disc-N' section of 'wit list --sections' """
+	discid=None
+	if conf.has_option(section, 'id'):
+		discid = conf.get(section, 'id')
+	if conf.has_option(section, 'name'):
+		label = conf.get(section, 'name')
+	if conf.has_option(section, 'title'):
+		# Better than 'name'
+		label = conf.get(section, 'title')
+	if conf.has_option(section, 'disctype'):
+		disctype = conf.get(section, 'disctype')
+		(disctype, disctypename) = disctype.split(' ', 1)
+		if disctypename:
+			label += ' [' + disctypename + ']'
+	if not icon:
+		if discid:
+			icon = 'http://art.gametdb.com/wii/cover/EN/' + discid + '.png'
+	return (label, icon)
+
+def wit_image_info_handler(path):
+	"""Uses the program 'wit' (http://wit.wiimm.de/) to extract
+	the disc label from the image. The URL
+	http://art.gametdb.com/wii/cover/EN/{DISID}.png
+	is returned as icon.
+	If 'wit' is not available or fails this falls back
+	to the filename_image_info_handler.
+	"""
+	# Fetch fallback data, first
+	(label, icon) = filename_image_info_handler(path)
+	executable = _find_wit()
+	if executable:
+		cmd = [executable, 'list', '--sections', path]
+		try:
+			p = subprocess.run(cmd, stdout=subprocess.PIPE)
+			conf = configparser.ConfigParser(interpolation=None)
+			conf.read_string(p.stdout.decode('UTF-8'))
+			if conf.has_section('disc-0'):
+				(label, icon) = _wit_disc_info(conf, 'disc-0', label, icon)
+		except:
+			LOGGER.exception("Failed to execute %s" % ' '.join(cmd))
+
+	return (label, icon)
+
+def wit_image_info_batch(paths):
+	""" Runs 'wit list --sections' once for all paths. The discs are
+	assigned to the images by their 'filename'. Images that wit does
+	not report are passed to wit_image_info_handler() one by one.
+	"""
+	if not _find_wit() or len(paths) < 2:
+		return [wit_image_info_handler(path) for path in paths]
+
+	executable = _find_wit()
+	results = [filename_image_info_handler(path) for path in paths]
+
+	indexes = dict((os.path.normcase(os.path.realpath(path)), i) for (i, path) in enumerate(paths))
+	found = set()
+	cmd = [executable, 'list', '--sections'] + list(paths)
+	try:
+		p = subprocess.run(cmd, stdout=subprocess.PIPE)
+		conf = configparser.ConfigParser(interpolation=None)
+		conf.read_string(p.stdout.decode('UTF-8'))
+		for section in conf.sections():
+			if not section.startswith('disc-'):
+				continue
+			for option in ['filename', 'path', 'file']:
+				if conf.has_option(section, option):
+					i = indexes.get(os.path.normcase(os.path.realpath(conf.get(section, option))))
+					if i is not None:
+						results[i] = _wit_disc_info(conf, section, results[i][0], results[i][1])
+						found.add(i)
+					break
+	except:
+		LOGGER.exception("Failed to execute %s" % ' '.join(cmd[0:3]))
+
+	for i in range(len(paths)):
+		if i not in found:
+			results[i] = wit_image_info_handler(paths[i])
+	return results
+
+def _read_at(f, offset, size):
+	""" Reads up to 'size' bytes at 'offset' without reading anything else """
+	if hasattr(os, 'pread'):
+		return os.pread(f.fileno(), size, offset)
+	f.seek(offset)
+	return f.read(size)
+
+def _text(data, encoding='latin-1'):
+	""" Decodes a NUL or space padded header field """
+	return data.split(b'\0', 1)[0].decode(encoding, 'replace').strip()
+
+def _header_handler(reader):
+	""" Turns a function that returns a header's (title, icon) or None into
+	an image info handler. The filename is used if the header is not
+	recognized.
+	"""
+	def handler(path):
+		(label, icon) = filename_image_info_handler(path)
+		try:
+			with open(path, 'rb') as f:
+				info = reader(f)
+		except (OSError, ValueError, struct.error, zlib.error) as e:
+			LOGGER.warning("Failed to read header of '%s': %s" % (path, e))
+			info = None
+		if info is not None:
+			if info[0]:
+				label = info[0]
+			icon = info[1]
+		return (label, icon)
+	handler.__name__ = reader.__name__
+	handler.__doc__ = reader.__doc__
+	return handler
+
+# GameCube and Wii disc headers
+_WII_MAGIC = 0x5D1C9EA3
+_GC_MAGIC = 0xC2339F3D
+_GCZ_MAGIC = 0xB10BC001
+_DISC_HEADER_SIZE = 0x100
+
+# Region character of a disc id -> GameTDB cover language
+_GAMETDB_REGIONS = {
+	'E': 'US', 'P': 'EN', 'J': 'JA', 'K': 'KO', 'D': 'DE',
+	'F': 'FR', 'S': 'ES', 'I': 'IT', 'H': 'NL', 'U': 'AU'
+}
+
+def _disc_header(f):
+	""" Returns the first bytes of the disc header of a plain, WBFS,
+	GCZ, WIA or RVZ image or None if the format is unknown.
+	"""
+	head = _read_at(f, 0, 0x20)
+	if len(head) < 0x20:
+		return None
+	if head[0:4] == b'WBFS':
+		# The first disc's info (starting with a copy of the disc
+		# header) is located in the second hd sector.
+		return _read_at(f, 1 << head[8], _DISC_HEADER_SIZE)
+	if head[0:4] == b'WIA\x01' or head[0:4] == b'RVZ\x01':
+		# The disc header is stored in 'header 2' after 'header 1' (0x48
+		# bytes) and its disc_type, compression and chunk_size fields.
+		return _read_at(f, 0x58, 0x80)
+	if struct.unpack_from('<I', head, 0)[0] == _GCZ_MAGIC:
+		(block_size, num_blocks) = struct.unpack_from('<II', head, 24)
+		if num_blocks == 0:
+			return None
+		pointers = struct.unpack('<%dQ' % min(num_blocks, 2), _read_at(f, 32, 8 * min(num_blocks, 2)))
+		data_offset = 32 + num_blocks * 12
+		uncompressed = pointers[0] & (1 << 63)
+		start = pointers[0] & ~(1 << 63)
+		end = (pointers[1] & ~(1 << 63)) if num_blocks > 1 else start + block_size
+		data = _read_at(f, data_offset + start, end - start)
+		if uncompressed:
+			return data[0:_DISC_HEADER_SIZE]
+		return zlib.decompressobj().decompress(data, _DISC_HEADER_SIZE)
+	return _read_at(f, 0, _DISC_HEADER_SIZE)
+
+def gamecube_wii_info(f):
+	""" Reads the disc id and title of GameCube and Wii images (ISO/GCM,
+	WBFS, GCZ, WIA and RVZ). The GameTDB cover URL for the disc's id
+	and region is returned as icon.
+	"""
+	header = _disc_header(f)
+	if header is None or len(header) < 0x40:
+		return None
+	(wii_magic, gc_magic) = struct.unpack_from('>II', header, 0x18)
+	if wii_magic != _WII_MAGIC and gc_magic != _GC_MAGIC:
+		return None
+	discid = _text(header[0:6], 'ascii')
+	region = discid[3:4]
+	title = _text(header[0x20:], 'shift_jis' if region == 'J' else 'latin-1')
+	icon = None
+	if len(discid) == 6 and discid.isalnum():
+		icon = 'http://art.gametdb.com/wii/cover/%s/%s.png' % (_GAMETDB_REGIONS.get(region, 'EN'), discid)
+	return (title, icon)
+
+def nes_info(f):
+	""" Validates the iNES header. iNES images don't contain a title,
+	so this is only useful to skip files that are not NES images.
+	"""
+	if _read_at(f, 0, 4) != b'NES\x1a':
+		return None
+	return (None, None)
+
+def snes_info(f):
+	""" Reads the internal title from the LoROM (0x7FC0) or HiROM
+	(0xFFC0) header of SNES images. A 512 byte copier header is
+	skipped.
+	"""
+	size = os.fstat(f.fileno()).st_size
+	skip = 0x200 if size % 0x400 == 0x200 else 0
+	best = None
+	for offset in [0x7FC0, 0xFFC0]:
+		header = _read_at(f, offset + skip, 0x20)
+		if len(header) < 0x20:
+			continue
+		(complement, checksum) = struct.unpack_from('<HH', header, 0x1C)
+		title = header[0:21]
+		printable = all(0x20 <= c < 0x7F for c in title)
+		if complement ^ checksum == 0xFFFF and printable:
+			best = title
+			break
+		if best is None and printable and title.strip():
+			best = title
+	if best is None:
+		return None
+	return (_text(best, 'ascii').title(), None)
+
+def gba_info(f):
+	""" Reads the title from the GBA cartridge header """
+	header = _read_at(f, 0xA0, 0x20)
+	# 0xB2 must be 0x96
+	if len(header) < 0x20 or header[0x12] != 0x96:
+		return None
+	title = _text(header[0:12], 'ascii')
+	return (title.title() if title else None, None)
+
+def n64_info(f):
+	""" Reads the title from N64 images in big endian (.z64), byte
+	swapped (.v64) or little endian (.n64) byte order.
+	"""
+	header = bytearray(_read_at(f, 0, 0x40))
+	if len(header) < 0x40:
+		return None
+	magic = bytes(header[0:4])
+	if magic == b'\x37\x80\x40\x12':
+		# 16 bit words are swapped
+		header[0::2], header[1::2] = header[1::2], header[0::2]
+	elif magic == b'\x40\x12\x37\x80':
+		# 32 bit little endian words
+		for i in range(0, len(header), 4):
+			header[i:i + 4] = header[i:i + 4][::-1]
+	elif magic != b'\x80\x37\x12\x40':
+		return None
+	title = _text(bytes(header[0x20:0x34]), 'shift_jis')
+	return (title.title() if title else None, None)
+
+register_image_info_handler('filename', filename_image_info_handler)
+register_image_info_handler('wit', wit_image_info_handler, wit_image_info_batch)
+register_image_info_handler('gamecube-wii', _header_handler(gamecube_wii_info))
+register_image_info_handler('nes', _header_handler(nes_info))
+register_image_info_handler('snes', _header_handler(snes_info))
+register_image_info_handler('gba', _header_handler(gba_info))
+register_image_info_handler('n64', _header_handler(n64_info))
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
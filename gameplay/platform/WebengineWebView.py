@@ -52,7 +52,8 @@ class FrontendWebPage(QWebEnginePage):
 	'warn', 'error' or 'exception' the appropirate level is
 	choosen instead.
 	
-	Additionally this adds support for the 'icon:///' url scheme
+	Additionally this adds support for the 'icon:///' and
+	'gameplay://api/' url schemes.
 	"""
 	def __init__(self, parent, gameplay, args):
 		QWebEnginePage.__init__(self, parent)
@@ -60,6 +61,8 @@ class FrontendWebPage(QWebEnginePage):
 		self.args = args
 		self.handler = IconSchemeHandler()
 		self.profile().installUrlSchemeHandler(b'icon', self.handler)
+		self.apiHandler = ApiSchemeHandler(gameplay.api)
+		self.profile().installUrlSchemeHandler(b'gameplay', self.apiHandler)
 		channel = QWebChannel(self);
 		self.setWebChannel(channel);
 		channel.registerObject("gameplay", gameplay);
@@ -115,5 +118,52 @@ class IconSchemeHandler(QWebEngineUrlSchemeHandler):
 		else:
 			job.fail(QWebEngineUrlRequestJob.UrlNotFound)
 
+class ApiSchemeHandler(QWebEngineUrlSchemeHandler):
+	""" Serves the JSON resources of 'gameplay://api/'. QtWebEngine does
+	not allow custom schemes to set response headers, so the ETag is
+	not visible here. The body is still served from the pre-serialized
+	cache instead of being converted from QVariants on each call.
+	"""
+	def __init__(self, api):
+		QWebEngineUrlSchemeHandler.__init__(self)
+		self.api = api
+
+	def requestStarted(self, job):
+		url = job.requestUrl()
+		if job.requestMethod() != b'GET' or url.host() != 'api':
+			return job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+
+		(status, headers, body) = self.api.request(url.path(), url.query())
+		if status != 200:
+			return job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+
+		buf = QBuffer(parent=self)
+		buf.open(QIODevice.WriteOnly)
+		buf.write(body)
+		buf.seek(0)
+		buf.close()
+		job.destroyed.connect(buf.deleteLater)
+		job.reply(headers['Content-Type'].split(';', 1)[0].encode('UTF-8'), buf)
+
+def register_url_schemes():
+	""" Registers 'gameplay://' as secure, CORS enabled scheme. It is
+	also registered as local scheme, so the UI, which is loaded from a
+	local file, may request it like other local files. This must be
+	called before the QApplication is created and requires Qt 5.12.
+	"""
+	try:
+		from PyQt5.QtWebEngineCore import QWebEngineUrlScheme
+	except ImportError:
+		return
+	scheme = QWebEngineUrlScheme(b'gameplay')
+	scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+	flags = QWebEngineUrlScheme.SecureScheme | QWebEngineUrlScheme.LocalScheme | QWebEngineUrlScheme.LocalAccessAllowed
+	if hasattr(QWebEngineUrlScheme, 'CorsEnabled'):
+		flags |= QWebEngineUrlScheme.CorsEnabled
+	scheme.setFlags(flags)
+	QWebEngineUrlScheme.registerScheme(scheme)
+
+register_url_schemes()
+
 #  vim: set fenc=utf-8 ts=4 sw=4 noet :
 
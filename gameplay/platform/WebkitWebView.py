@@ -15,7 +15,7 @@ import logging
 
 from ..utils import get_icon_data
 from PyQt5.QtWebKitWidgets import QWebView, QWebPage, QWebInspector
-from PyQt5.QtWebKit import QWebSettings
+from PyQt5.QtWebKit import QWebSettings, QWebSecurityOrigin
 from PyQt5.QtNetwork import QNetworkReply, QNetworkAccessManager, QNetworkRequest
 from PyQt5.QtCore import QVariant, QTimer
 
@@ -24,6 +24,10 @@ LOGGER = logging.getLogger(__name__)
 # Enable web inspector
 QWebSettings.globalSettings().setAttribute(QWebSettings.DeveloperExtrasEnabled, True)
 
+# Treat 'gameplay://' like local files, so the UI (which is loaded
+# from a local file) may request 'gameplay://api/'
+QWebSecurityOrigin.addLocalScheme('gameplay')
+
 class Inspector(QWebInspector):
 	""" Returns QWebKit's QWebInspector """
 	def __init__(self, parent, view):
@@ -43,14 +47,15 @@ class FrontendWebPage(QWebPage):
 	'warn', 'error' or 'exception' the appropirate level is
 	choosen instead.
 	
-	Additionally this adds support for the 'icon:///' url scheme
+	Additionally this adds support for the 'icon:///' and
+	'gameplay://api/' url schemes.
 	"""
 
 	def __init__(self, parent, gameplay, args):
 		QWebPage.__init__(self, parent)
 		self.gameplay = gameplay
 		self.args = args
-		self.setNetworkAccessManager(NetworkAccessManager(self.networkAccessManager()))
+		self.setNetworkAccessManager(NetworkAccessManager(self.networkAccessManager(), gameplay.api))
 		self.frame = self.mainFrame()
 		self.frame.javaScriptWindowObjectCleared.connect(self.load_api)
 
@@ -132,16 +137,49 @@ class IconSchemeReply(QNetworkReply):
 		return data
 
 
+class ApiSchemeReply(IconSchemeReply):
+	""" API Reply - responds to requests starting with gameplay://api/
+	with JSON data. Conditional requests (If-None-Match and
+	If-Modified-Since) are answered with 304 if the data is unchanged.
+	"""
+
+	def __init__(self, parent, url, operation, api, request):
+		QNetworkReply.__init__(self, parent)
+		self.setOperation(operation)
+		self.setUrl(url)
+		self.bytes_read = 0
+
+		(self.status, self.headers, self.content) = api.request(url.path(), url.query(),
+				bytes(request.rawHeader(b'If-None-Match')).decode('latin-1'),
+				bytes(request.rawHeader(b'If-Modified-Since')).decode('latin-1'))
+		self.content_type = self.headers.get('Content-Type')
+		QTimer.singleShot(0, self.load_content)
+
+	def load_content(self):
+		self.setAttribute(QNetworkRequest.HttpStatusCodeAttribute, QVariant(self.status))
+		if self.status == 404:
+			self.setError(QNetworkReply.ContentNotFoundError, 'Not Found')
+		else:
+			self.open(self.ReadOnly | self.Unbuffered)
+			for (name, value) in self.headers.items():
+				self.setRawHeader(name.encode('latin-1'), value.encode('latin-1'))
+			self.setHeader(QNetworkRequest.ContentLengthHeader, QVariant(len(self.content)))
+		self.readyRead.emit()
+		self.finished.emit()
+
 class NetworkAccessManager(QNetworkAccessManager):
-	def __init__(self, old_manager):
+	def __init__(self, old_manager, api):
 		QNetworkAccessManager.__init__(self)
 		self.old_manager = old_manager
+		self.api = api
 		self.setCache(old_manager.cache())
 		self.setCookieJar(old_manager.cookieJar())
 		self.setProxy(old_manager.proxy())
 		self.setProxyFactory(old_manager.proxyFactory())
 
 	def createRequest(self, operation, request, data):
+		if request.url().scheme() == 'gameplay' and request.url().host() == 'api' and operation == self.GetOperation:
+			return ApiSchemeReply(self, request.url(), self.GetOperation, self.api, request)
 		if request.url().scheme() != "icon":
 			return QNetworkAccessManager.createRequest(self, operation, request, data)
 	
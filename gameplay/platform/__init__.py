@@ -0,0 +1,37 @@
+"""
+Platform dependend OS calls.
+
+system_module() imports the implementation for the current system
+(linux, darwin or windows) on first use.
+"""
+
+import platform
+import logging
+import importlib
+
+LOGGER = logging.getLogger(__name__)
+
+_SYSTEMS = {
+	'Linux': 'linux',
+	'Darwin': 'darwin',
+	'Windows': 'windows'
+}
+
+_module = None
+
+def system_module():
+	""" Returns the platform module of the current system """
+	global _module
+	if _module is None:
+		system = platform.system()
+		name = _SYSTEMS.get(system)
+		if name is None:
+			# Try with linux as fallback...
+			LOGGER.info('Detected unknown system, using Linux API')
+			name = 'linux'
+		else:
+			LOGGER.info('Detected %s system' % system)
+		_module = importlib.import_module('.' + name, __name__)
+	return _module
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
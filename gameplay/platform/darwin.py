@@ -4,7 +4,7 @@ FIXME Not tested, yet
 """
 from AppKit import NSWorkspace, NSApplicationActivationOptions
 
-def get_foreground_window():
+def get_foreground_window(owns=None):
 	"""
 	Returns the name (or pointer, or whatever is
 	required as set_foreground_window argument)
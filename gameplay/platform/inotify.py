@@ -0,0 +1,103 @@
+"""
+Minimal ctypes binding for the Linux inotify API.
+
+The descriptor is opened in non-blocking mode and drained on demand
+by read_events(), so no additional thread or event loop integration
+is required.
+"""
+
+import os
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+_libc = None
+def _load_libc():
+	global _libc
+	if _libc is None:
+		libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+		# Raises AttributeError if inotify is not supported
+		libc.inotify_init1
+		libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+		libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+		_libc = libc
+	return _libc
+
+def available():
+	""" Returns True if inotify can be used on this system """
+	try:
+		_load_libc()
+		return True
+	except:
+		return False
+
+class Inotify:
+	def __init__(self):
+		self._libc = _load_libc()
+		self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if self.fd < 0:
+			e = ctypes.get_errno()
+			raise OSError(e, os.strerror(e))
+
+	def add_watch(self, path, mask):
+		""" Adds a watch for path and returns the watch descriptor.
+		Raises OSError on failure (e.g. ENOSPC if the number of
+		watches is exhausted).
+		"""
+		wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+		if wd < 0:
+			e = ctypes.get_errno()
+			raise OSError(e, os.strerror(e), path)
+		return wd
+
+	def rm_watch(self, wd):
+		""" Removes a watch. Errors are ignored since the kernel removes
+		the watch on its own when the watched directory is deleted.
+		"""
+		self._libc.inotify_rm_watch(self.fd, wd)
+
+	def read_events(self):
+		""" Returns a list of all pending (wd, mask, cookie, name) tuples
+		without blocking.
+		"""
+		events = []
+		while True:
+			try:
+				buf = os.read(self.fd, 65536)
+			except BlockingIOError:
+				break
+			if not buf:
+				break
+			offset = 0
+			while offset + _EVENT_HEADER.size <= len(buf):
+				(wd, mask, cookie, length) = _EVENT_HEADER.unpack_from(buf, offset)
+				offset += _EVENT_HEADER.size
+				name = buf[offset:offset + length].rstrip(b'\0')
+				offset += length
+				events.append((wd, mask, cookie, os.fsdecode(name)))
+		return events
+
+	def close(self):
+		if self.fd >= 0:
+			os.close(self.fd)
+			self.fd = -1
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
@@ -1,35 +1,60 @@
 """
 Platform dependend OS calls - linux edition
+
+Windows are tracked in-process with python-xlib (see x11.py). If that
+is not available 'xdotool' is used to find and activate windows by name.
 """
 
 import subprocess
 import logging
+
+from . import x11
+from ..executables import find_executable
+
 LOGGER=logging.getLogger(__name__)
 
-# Check if xdotool is available
-xdotool=None
-p = subprocess.run(['which', 'xdotool'], stdout=subprocess.PIPE)
-xdotool = p.stdout.rstrip()
-if p.returncode != 0 or p.stdout.rstrip() == '':
-	LOGGER.warn('"xdotool" is not available. Change the active window might not work. To resolve this please install "xdotool"')
-	xdotool = None
+_xdotool = None
 
-def get_foreground_window():
+def xdotool():
+	""" Returns the path of 'xdotool' or None. The lookup is
+	done on first use.
+	"""
+	global _xdotool
+	if _xdotool is None:
+		_xdotool = find_executable('xdotool')
+		if not _xdotool:
+			LOGGER.warn('Neither "python-xlib" nor "xdotool" is available. Change the active window might not work. To resolve this please install "python-xlib"')
+	return _xdotool or None
+
+def get_foreground_window(owns=None):
 	""" Returns the name (or pointer, or whatever is
 	required as set_foreground_window argument)
 	of the currently active window
+
+	'owns' is an optional callable that returns True for the
+	process ids of the app. If given the app's window is
+	returned even if it's not the active one.
 	"""
-	if not xdotool:
+	tracker = x11.tracker()
+	if tracker is not None:
+		window = tracker.find_window(owns) if owns is not None else None
+		return window if window is not None else tracker.active_window()
+
+	if not xdotool():
 		return None
-	cmd = ['xdotool', 'getwindowfocus', 'getwindowname']
+	cmd = [xdotool(), 'getwindowfocus', 'getwindowname']
 	p = subprocess.run(cmd, stdout=subprocess.PIPE)
 	return p.stdout.rstrip()
 
 def set_foreground_window(name):
 	""" Changes the currently active window """
-	if not xdotool:
+	if isinstance(name, int):
+		# A window id of the X11 window tracker
+		x11.tracker().activate(name)
+		return
+	if not xdotool():
 		return None
-	cmd = ['xdotool', 'search', '--name', name, 'windowactivate']
+	cmd = [xdotool(), 'search', '--name', name, 'windowactivate']
 	subprocess.run(cmd)
 
 def find_icon_by_name(iconName):
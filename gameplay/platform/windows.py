@@ -7,8 +7,9 @@ import logging
 import win32gui
 import ctypes
 
-from PyQt5.QtCore import QDir, QStandardPaths, QByteArray, QBuffer, QIODevice
+from PyQt5.QtCore import QDir, QByteArray, QBuffer, QIODevice
 from extract_icon import ExtractIcon
+from ..executables import find_executable
 
 LOGGER = logging.getLogger(__name__)
 
@@ -16,7 +17,7 @@ LOGGER = logging.getLogger(__name__)
 myappid = 'net.bitarbeiter.gameplay' # arbitrary string
 ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
 
-def get_foreground_window():
+def get_foreground_window(owns=None):
 	""" Returns the name (or pointer, or whatever is
 	required as set_foreground_window argument)
 	of the currently active window
@@ -31,7 +32,7 @@ def find_icon_by_name(iconName):
 	""" Returns the content and content type of an Icon by name or path."""
 
 	# Check if iconName is an executable
-	path = QStandardPaths.findExecutable(iconName)
+	path = find_executable(iconName)
 	if path:
 		path = QDir.toNativeSeparators(path)
 		try:
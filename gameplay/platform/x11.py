@@ -0,0 +1,155 @@
+"""
+In-process window tracking for X11 window managers that implement EWMH.
+
+The windows of all clients (_NET_CLIENT_LIST_STACKING) are mapped to the
+process ids in their _NET_WM_PID property. The mapping is built once and
+then updated when a PropertyNotify event of the root window reports a
+change of the client list or the active window, so looking up an app's
+window doesn't need any round trips if nothing has changed. Only events
+of the root window are selected, and they are read from the Qt event
+loop as soon as they arrive. Windows are activated by id with a
+_NET_ACTIVE_WINDOW client message.
+
+Requires python-xlib. tracker() returns None if it is not installed or
+if no X display is available.
+"""
+
+import os
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+try:
+	from Xlib import X, display as xdisplay, error as xerror
+	from Xlib.protocol import event as xevent
+except ImportError:
+	X = None
+
+class WindowTracker:
+	def __init__(self, name=None):
+		""" Connects to the display 'name' (default: $DISPLAY) """
+		self.display = xdisplay.Display(name)
+		# Errors of asynchronous requests refer to windows that
+		# have been destroyed meanwhile, there's nothing to do.
+		self.display.set_error_handler(lambda *args: None)
+		self.root = self.display.screen().root
+		self._atoms = {}
+		self._pids = {}
+		self._stacking = []
+		self._active = None
+		self._clients_changed = True
+		self._active_changed = True
+		# _NET_CLIENT_LIST* and _NET_ACTIVE_WINDOW are properties of
+		# the root window, so PropertyNotify is all we need.
+		self.root.change_attributes(event_mask=X.PropertyChangeMask)
+		self.display.flush()
+		self.notifier = None
+		try:
+			from PyQt5.QtCore import QSocketNotifier
+			self.notifier = QSocketNotifier(self.display.fileno(), QSocketNotifier.Read)
+			self.notifier.activated.connect(self._drain)
+		except ImportError:
+			pass
+
+	def _atom(self, name):
+		atom = self._atoms.get(name)
+		if atom is None:
+			atom = self.display.intern_atom(name)
+			self._atoms[name] = atom
+		return atom
+
+	def _property(self, window, name):
+		""" Returns the values of a window property or an empty list """
+		try:
+			if not hasattr(window, 'get_full_property'):
+				window = self.display.create_resource_object('window', window)
+			prop = window.get_full_property(self._atom(name), X.AnyPropertyType)
+		except (xerror.BadWindow, xerror.BadAtom):
+			return []
+		if prop is None:
+			return []
+		return list(prop.value)
+
+	def _drain(self, *args):
+		""" Applies all events that have been received since the last call """
+		for i in range(self.display.pending_events()):
+			e = self.display.next_event()
+			if e.type == X.PropertyNotify and e.window.id == self.root.id:
+				if e.atom in (self._atom('_NET_CLIENT_LIST_STACKING'), self._atom('_NET_CLIENT_LIST')):
+					self._clients_changed = True
+				elif e.atom == self._atom('_NET_ACTIVE_WINDOW'):
+					self._active_changed = True
+
+	def update(self):
+		""" Brings the window map up to date """
+		self._drain()
+		if self._clients_changed:
+			self._clients_changed = False
+			stacking = self._property(self.root, '_NET_CLIENT_LIST_STACKING') or self._property(self.root, '_NET_CLIENT_LIST')
+			pids = {}
+			for wid in stacking:
+				pid = self._pids.get(wid)
+				if pid is None:
+					# New window, or one that had no _NET_WM_PID yet
+					values = self._property(wid, '_NET_WM_PID')
+					pid = values[0] if values else None
+				pids[wid] = pid
+			self._pids = pids
+			self._stacking = stacking
+		if self._active_changed:
+			self._active_changed = False
+			values = self._property(self.root, '_NET_ACTIVE_WINDOW')
+			self._active = values[0] if values and values[0] else None
+
+	def active_window(self):
+		""" Returns the id of the active window or None """
+		self.update()
+		return self._active
+
+	def windows(self, owns):
+		""" Returns the ids of the windows whose process is accepted by
+		the callable 'owns', topmost first.
+		"""
+		self.update()
+		return [wid for wid in reversed(self._stacking) if self._pids.get(wid) is not None and owns(self._pids[wid])]
+
+	def find_window(self, owns):
+		""" Returns the active window if it belongs to 'owns', otherwise
+		its topmost window. Returns None if there is none.
+		"""
+		windows = self.windows(owns)
+		if self._active in windows:
+			return self._active
+		return windows[0] if windows else None
+
+	def activate(self, wid):
+		""" Asks the window manager to activate (and map) a window """
+		window = self.display.create_resource_object('window', wid)
+		# Source indication 2: request from a pager, which is honored
+		# regardless of the focus stealing prevention
+		e = xevent.ClientMessage(window=window, client_type=self._atom('_NET_ACTIVE_WINDOW'),
+				data=(32, [2, X.CurrentTime, 0, 0, 0]))
+		self.root.send_event(e, event_mask=X.SubstructureRedirectMask | X.SubstructureNotifyMask)
+		self.display.flush()
+
+_tracker = None
+_failed = False
+
+def tracker():
+	""" Returns the shared WindowTracker of $DISPLAY or None """
+	global _tracker, _failed
+	if _tracker is None and not _failed:
+		if X is None:
+			LOGGER.info('python-xlib is not available')
+			_failed = True
+		elif not os.environ.get('DISPLAY'):
+			_failed = True
+		else:
+			try:
+				_tracker = WindowTracker()
+			except Exception as e:
+				LOGGER.warning('Failed to connect to X display: %s' % e)
+				_failed = True
+	return _tracker
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
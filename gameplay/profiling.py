@@ -0,0 +1,108 @@
+"""
+Startup profiling (--profile-startup).
+
+enable() installs an import hook that measures how long each module
+takes to execute, both including and excluding the modules it imports
+itself. Initialization steps are measured with measure(). report()
+prints the slowest modules and all steps.
+
+This module must not import anything from the gameplay package, so
+that it can be enabled before the first of them is imported.
+"""
+
+import sys
+import time
+import threading
+import contextlib
+
+_enabled = False
+_start = time.perf_counter()
+_imports = []
+_steps = []
+_local = threading.local()
+
+class _TimedLoader:
+	""" Wraps a module loader to measure exec_module() """
+
+	def __init__(self, loader, name):
+		self.loader = loader
+		self.name = name
+
+	def create_module(self, spec):
+		if hasattr(self.loader, 'create_module'):
+			return self.loader.create_module(spec)
+		return None
+
+	def exec_module(self, module):
+		stack = _local.__dict__.setdefault('stack', [])
+		stack.append(0.0)
+		start = time.perf_counter()
+		try:
+			self.loader.exec_module(module)
+		finally:
+			elapsed = time.perf_counter() - start
+			children = stack.pop()
+			if stack:
+				stack[-1] += elapsed
+			_imports.append((self.name, elapsed, elapsed - children))
+
+	def __getattr__(self, name):
+		return getattr(self.loader, name)
+
+class _TimingFinder:
+	""" Asks the other finders for a module spec and wraps its loader """
+
+	def find_spec(self, name, path=None, target=None):
+		for finder in sys.meta_path:
+			if finder is self or not hasattr(finder, 'find_spec'):
+				continue
+			spec = finder.find_spec(name, path, target)
+			if spec is not None:
+				if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+					spec.loader = _TimedLoader(spec.loader, name)
+				return spec
+		return None
+
+def enable():
+	""" Starts measuring imports """
+	global _enabled, _start
+	if not _enabled:
+		_enabled = True
+		_start = time.perf_counter()
+		sys.meta_path.insert(0, _TimingFinder())
+
+def is_enabled():
+	return _enabled
+
+@contextlib.contextmanager
+def measure(label):
+	""" Measures the time of a 'with' block if profiling is enabled """
+	if not _enabled:
+		yield
+		return
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		_steps.append((label, time.perf_counter() - start))
+
+def report(stream=None, limit=30):
+	""" Prints the slowest imports and all measured steps """
+	if not _enabled:
+		return
+	if stream is None:
+		stream = sys.stderr
+	total = time.perf_counter() - _start
+	stream.write('Startup profile (%.1f ms since profiling started)\n' % (total * 1000))
+	stream.write('\n  %10s %10s  %s\n' % ('self [ms]', 'incl [ms]', 'module'))
+	for (name, inclusive, own) in sorted(_imports, key=lambda entry: entry[2], reverse=True)[0:limit]:
+		stream.write('  %10.1f %10.1f  %s\n' % (own * 1000, inclusive * 1000, name))
+	stream.write('  %10.1f %10s  (%d modules)\n' % (sum(entry[2] for entry in _imports) * 1000, '', len(_imports)))
+	if _steps:
+		stream.write('\n  %10s  %s\n' % ('time [ms]', 'step'))
+		for (label, elapsed) in _steps:
+			stream.write('  %10.1f  %s\n' % (elapsed * 1000, label))
+	stream.write('\n')
+	stream.flush()
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
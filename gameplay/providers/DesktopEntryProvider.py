@@ -6,13 +6,14 @@ Parse .desktop entries from the following locations:
 
 import os
 import sys
-import configparser
 import shlex
 import re
 
 from urllib.parse import quote
 from gameplay.AppProvider import AppProvider, AppItem
-from PyQt5.QtCore import QDir, QStandardPaths
+from gameplay import desktopentry
+from gameplay.executables import find_executable
+from PyQt5.QtCore import QDir, QStandardPaths, QLocale
 
 class DesktopEntryProvider(AppProvider):
 	def __init__(self, settings, sources=None):
@@ -22,6 +23,7 @@ class DesktopEntryProvider(AppProvider):
 			self.sources.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])) + os.sep + 'applications')
 		else:
 			self.sources = sources
+		self.locales = desktopentry.locale_keys(QLocale.system().name())
 	
 	def filter_category(self, categories):
 		""" This can be overwritten to filter apps by their categories. """
@@ -40,51 +42,80 @@ class DesktopEntryProvider(AppProvider):
 						filesByName[filename] = root + os.sep + filename
 		return list(filesByName.values())
 	
-	def parse_file(self, f):
-		""" Parses a .desktop file using configparser """
-		cfg = configparser.ConfigParser()
+	def read_file(self, f):
+		""" Reads the relevant keys of a .desktop file, see gameplay.desktopentry.
+		Returns a dict or None if the file does not describe an application.
+		The result only depends on the file's content, so it can be cached.
+		"""
 		try:
-			cfg.read_file(open(f))
-		except:
-			pass
-		if cfg.has_section('Desktop Entry'):
-			apptype = cfg.get('Desktop Entry', 'Type', fallback=None, raw=True)
-			if apptype is None or apptype == 'Application':
-				name = cfg.get('Desktop Entry', 'Name', fallback=None, raw=True)
-				cmd = cfg.get('Desktop Entry', 'Exec', fallback=None, raw=True)
-				if cmd and name:
-					icon = cfg.get('Desktop Entry', 'Icon', fallback=None, raw=True)
-					categories = [x for x in cfg.get('Desktop Entry', 'Categories', fallback='', raw=True).split(';') if x]
+			with open(f, encoding='UTF-8', errors='replace') as fp:
+				groups = desktopentry.read_entry(fp, ['Fullscreen'])
+		except OSError:
+			return None
+		if groups is None:
+			return None
+
+		entry = groups[desktopentry.DESKTOP_ENTRY]
+		apptype = entry.get('Type')
+		if apptype is not None and apptype != 'Application':
+			return None
+
+		name = entry.get('Name')
+		cmd = entry.get('Exec')
+		if not cmd or not name:
+			return None
+		cmd = groups.get('Desktop Action Fullscreen', {}).get('Exec', cmd)
 
-				if cfg.has_section('Desktop Action Fullscreen'):
-					cmd = cfg.get('Desktop Action Fullscreen', 'Exec', fallback=cmd, raw=True)
+		# Keep all translations, the locale is chosen in parse_file()
+		names = {}
+		for (key, value) in entry.items():
+			if key == 'Name' or key.startswith('Name['):
+				names[key] = desktopentry.unescape(value)
+
+		return {
+			'names': names,
+			'exec': desktopentry.unescape(cmd),
+			'icon': desktopentry.unescape(entry['Icon']) if entry.get('Icon') else None,
+			'categories': desktopentry.split_list(entry.get('Categories', '')),
+			'tryExec': desktopentry.unescape(entry['TryExec']) if entry.get('TryExec') else None,
+			'noDisplay': entry.get('NoDisplay') == 'true' or entry.get('Hidden') == 'true',
+			'onlyShowIn': desktopentry.split_list(entry.get('OnlyShowIn', '')),
+			'notShowIn': desktopentry.split_list(entry.get('NotShowIn', ''))
+		}
+
+	def parse_file(self, f):
+		""" Parses a .desktop file and returns an AppItem or None """
+		entry = self.cached('desktop/entries', f, self.read_file)
+		if entry is None:
+			return None
 
-				tryExec = cfg.get('Desktop Entry', 'TryExec', fallback=None, raw=True)
-				noDisplay = cfg.getboolean('Desktop Entry', 'NoDisplay', fallback=False, raw=True)
-				onlyShowIn = [x for x in cfg.get('Desktop Entry', 'OnlyShowIn', fallback='', raw=True).split(';') if x]
-				notShowIn = [x for x in cfg.get('Desktop Entry', 'NotShowIn', fallback='', raw=True).split(';') if x]
-				if noDisplay:
-					return None
-				if len(onlyShowIn) > 0 and 'GamePlay' not in onlyShowIn:
-					return None
-				if len(notShowIn) > 0 and 'GamePlay' in notShowIn:
-					return None
-				if tryExec and not QStandardPaths.findExecutable(tryExec) and not os.path.exists(tryExec):
-					return None
+		name = desktopentry.localized(entry['names'], 'Name', self.locales)
+		cmd = entry['exec']
+		icon = entry['icon']
+		categories = entry['categories']
+		tryExec = entry['tryExec']
+		if entry['noDisplay']:
+			return None
+		if len(entry['onlyShowIn']) > 0 and 'GamePlay' not in entry['onlyShowIn']:
+			return None
+		if len(entry['notShowIn']) > 0 and 'GamePlay' in entry['notShowIn']:
+			return None
+		if tryExec and not find_executable(tryExec) and not os.path.exists(tryExec):
+			return None
 
-				# Remove field codes from command, we do not have them
-				# https://standards.freedesktop.org/desktop-entry-spec/desktop-entry-spec-latest.html#exec-variables
-				if cmd.find('%') >= 0:
-					cmd = re.sub(r'%%', '%', re.sub(r'%[^%]', '', cmd))
-				cmd = shlex.split(cmd)
-				if len(cmd) == 0 or (not QStandardPaths.findExecutable(cmd[0]) and not os.path.exists(cmd[0])):
-					return None;
+		# Remove field codes from command, we do not have them
+		# https://standards.freedesktop.org/desktop-entry-spec/desktop-entry-spec-latest.html#exec-variables
+		if cmd.find('%') >= 0:
+			cmd = re.sub(r'%%', '%', re.sub(r'%[^%]', '', cmd))
+		cmd = shlex.split(cmd)
+		if len(cmd) == 0 or (not find_executable(cmd[0]) and not os.path.exists(cmd[0])):
+			return None;
 
-				if icon:
-					icon = 'icon:///' + quote(icon)
+		if icon:
+			icon = 'icon:///' + quote(icon)
 
-				if self.filter_category(categories):
-					return AppItem(os.path.basename(f), name, icon=icon, cmd=cmd, categories=categories)
+		if self.filter_category(categories):
+			return AppItem(os.path.basename(f), name, icon=icon, cmd=cmd, categories=categories)
 		return None
 	
 	def get_apps(self):
@@ -14,111 +14,89 @@ import os
 import sys
 import platform
 import logging
-import configparser
-import subprocess
 import fnmatch
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtCore import *
 
 from gameplay.AppProvider import AppProvider, AppItem
 from gameplay.GamePlayConfig import GamePlayConfig
+from gameplay.AppCatalog import stat_signature
+from gameplay.ImageIndex import ImageIndex
+from gameplay.ArtworkIndex import ArtworkIndex
+from gameplay.imageinfo import get_image_info_handler, get_image_info_batch_handler, image_info_handler_names
 
 LOGGER = logging.getLogger(__name__)
 CONF_EMULATOR_SECTION='providers/emulator'
 CONF_EMULATOR_ENABLED='enabled'
+CONF_EMULATOR_WATCH='watch'
+CONF_EMULATOR_WORKERS='workers'
 
-def filename_image_info_handler(path):
-	""" Uses the basename (without suffix and underscores
-	replaced with spaces) for 'name'. If a .png, .jpg,
-	.jpeg or .gif file exists next to the basename this
-	is returned as icon.
-	"""
-	info = QFileInfo(path)
-	basename = info.completeBaseName()
-	abspath = info.absolutePath()
-	icon = None
-	for suffix in ['jpeg', 'JPEG', 'jpg', 'JPG', 'png', 'PNG', 'apng', 'APNG', 'gif', 'GIF']:
-		if QFile(abspath + '/' + basename + '.' + suffix).exists():
-			icon = abspath + os.sep + basename + '.' + suffix
-			break
-	if icon is None:
-		# Try short basename instead of long one, if the filename has multiple suffixes
-		basename2 = info.baseName()
-		if basename2 != basename:
-			for suffix in ['jpeg', 'JPEG', 'jpg', 'JPG', 'png', 'PNG', 'apng', 'APNG', 'gif', 'GIF']:
-				if QFile(abspath + basename2 + '.' + suffix).exists():
-					icon = abspath + basename2 + '.' + suffix
-					basename = basename2
-					break
-	
-	return (basename.replace('_', ' '), icon)
-
-def wit_image_info_handler(path):
-	"""Uses the program 'wit' (http://wit.wiimm.de/) to extract
-	the disc label from the image. If there is a .png, .jpeg,
-	.jpg or .gif file next to the images basename it is
-	returned as icon. Otherwise the URL
-	http://art.gametdb.com/wii/cover/EN/{DISID}.png
-	is returned as a placeholder.
-	If 'wit' is not available or fails this falls back
-	to the filename_image_info_handler.
-	"""
-	# Fetch fallback data, first
-	(label, icon) = filename_image_info_handler(path)
-	if wit_image_info_handler.executable is None:
-		# Try to locate wit executable
-		wit_image_info_handler.executable = QStandardPaths.findExecutable('wit')
-		if not wit_image_info_handler.executable:
-			wit_image_info_handler.executable = QStandardPaths.findExecutable('wit.exe')
-			if not wit_image_info_handler.executable:
-				wit_image_info_handler.executable = False
-	
-	if wit_image_info_handler.executable:
-		wit_image_info_handler.executable = QDir.toNativeSeparators(wit_image_info_handler.executable)
-		discid=None
-		cmd = [wit_image_info_handler.executable, 'list', '--sections', path]
-		try:
-			p = subprocess.run(cmd, stdout=subprocess.PIPE)
-			conf = configparser.ConfigParser()
-			conf.read_string(p.stdout.decode('UTF-8'))
-			if conf.has_section('disc-0'):
-				if conf.has_option('disc-0', 'id'):
-					discid = conf.get('disc-0', 'id')
-				if conf.has_option('disc-0', 'name'):
-					label = conf.get('disc-0', 'name')
-				if conf.has_option('disc-0', 'title'):
-					# Better than 'name'
-					label = conf.get('disc-0', 'title')
-				if conf.has_option('disc-0', 'disctype'):
-					disctype = conf.get('disc-0', 'disctype')
-					(disctype, disctypename) = disctype.split(' ', 1)
-					if disctypename:
-						label += ' [' + disctypename + ']'
-		except:
-			LOGGER.exception("Failed to execute %s" % ' '.join(cmd))
-		if not icon:
-			if discid:
-				icon = 'http://art.gametdb.com/wii/cover/EN/' + discid + '.png'
+# Number of images passed to an image info handler at once
+BATCH_SIZE=32
+
+# Default for the maximum number of image info handlers running in parallel
+DEFAULT_WORKERS=min(8, os.cpu_count() or 1)
 
-	return (label, icon)
-wit_image_info_handler.executable=None
+# Values of the 'image-id' option in 'emulators.ini'
+IMAGE_ID_PATH='path'
+IMAGE_ID_FINGERPRINT='fingerprint'
+
+# Number of bytes hashed at the beginning and end of an image
+FINGERPRINT_BLOCK_SIZE=64 * 1024
+
+def image_fingerprint(path):
+	""" Returns a hash of the image's size and its first and last block.
+	This is much faster than hashing the whole image and good enough
+	to recognize an image that has been moved.
+	"""
+	with open(path, 'rb') as f:
+		size = os.fstat(f.fileno()).st_size
+		sha_1 = hashlib.sha1()
+		sha_1.update(str(size).encode('ascii'))
+		sha_1.update(f.read(FINGERPRINT_BLOCK_SIZE))
+		if size > FINGERPRINT_BLOCK_SIZE:
+			f.seek(max(FINGERPRINT_BLOCK_SIZE, size - FINGERPRINT_BLOCK_SIZE))
+			sha_1.update(f.read(FINGERPRINT_BLOCK_SIZE))
+	return sha_1.hexdigest()
 
 class Emulator:
-	def __init__(self, config, section):
+	def __init__(self, provider, config, section, watch=False, workers=DEFAULT_WORKERS):
+		self.provider = provider
 		self.label = config.get(section, 'label', section)
 		self.command = config.getlist(section, 'command', None)
 		self.icon = config.get(section, 'icon', None)
 		self.image_path = config.getlist(section, 'image-path', [])
 		self.image_pattern = config.getlist(section, 'image-pattern', [])
-		image_info_handler = config.get(section, 'image-info-handler', None)
-		if image_info_handler == 'wit':
-			self.image_info_handler = wit_image_info_handler
-		elif image_info_handler == 'filename':
-			self.image_info_handler = filename_image_info_handler
-		else:
-			self.image_info_handler = filename_image_info_handler
-	
-	def get_apps(self):
+		image_info_handler = config.get(section, 'image-info-handler', 'filename')
+		self.image_info_handler = get_image_info_handler(image_info_handler)
+		if self.image_info_handler is None:
+			LOGGER.warning("Emulator/%s: Unknown image-info-handler '%s', available are: %s" % (self.label, image_info_handler, ', '.join(image_info_handler_names())))
+			image_info_handler = 'filename'
+			self.image_info_handler = get_image_info_handler(image_info_handler)
+		self.image_info_handler_name = image_info_handler
+		self.image_info_batch = get_image_info_batch_handler(image_info_handler)
+		self.workers = max(1, workers)
+		image_id = config.get(section, 'image-id', IMAGE_ID_PATH)
+		if image_id != IMAGE_ID_PATH and image_id != IMAGE_ID_FINGERPRINT:
+			LOGGER.warning("Emulator/%s: Unknown image-id '%s', using '%s'" % (self.label, image_id, IMAGE_ID_PATH))
+		self.fingerprint_ids = image_id == IMAGE_ID_FINGERPRINT
+
+		# In watch mode the images are tracked by an ImageIndex and
+		# only added or removed images are processed on get_apps().
+		self.index = None
+		self.artwork = ArtworkIndex()
+		self._apps = {}
+		self._infos = {}
+		# Image path -> fingerprint and fingerprint -> path of the
+		# image that uses it as ID (in case of duplicate images).
+		self._fingerprints = {}
+		self._id_owners = {}
+		if watch:
+			self.index = ImageIndex([os.path.expanduser(path) for path in self.image_path], self.image_pattern)
+
+	def find_images(self):
+		""" Walks all image paths and returns a list of matching files """
 		files=[]
 		for path in  self.image_path:
 			path=os.path.expanduser(path)
@@ -129,45 +107,200 @@ class Emulator:
 						fullpath = os.path.join(root, filename)
 						LOGGER.info("Emulator/%s: Found '%s'" % (self.label, fullpath))
 						files.append(os.path.join(fullpath))
+		return files
 
-		apps = []
+	def get_apps(self):
+		changed = self.artwork.refresh()
+		if self.index is None:
+			self._fingerprints = {}
+			self._id_owners = {}
+			files = self.find_images()
+			infos = self.image_infos(files)
+			return [self.create_app(f, infos[f]) for f in files if f in infos]
+
+		(added, removed) = self.index.update()
+		for f in removed:
+			self._apps.pop(f, None)
+			self._infos.pop(f, None)
+			fingerprint = self._fingerprints.pop(f, None)
+			if fingerprint is not None and self._id_owners.get(fingerprint) == f:
+				del self._id_owners[fingerprint]
+		infos = self.image_infos(added)
+		for f in added:
+			LOGGER.info("Emulator/%s: Found '%s'" % (self.label, f))
+			if f in infos:
+				self._infos[f] = infos[f]
+		# Recreate new apps and those whose artwork has changed
+		for (f, info) in self._infos.items():
+			if f in infos or os.path.dirname(f) in changed:
+				self._apps[f] = self.create_app(f, info)
+		return list(self._apps.values())
+
+	def image_infos(self, files):
+		""" Returns a dict that maps image paths to (label, icon) tuples.
+		Results are taken from the provider's catalog if the image hasn't
+		changed. All other images are passed to the image info handler's
+		batch function in chunks of BATCH_SIZE, using at most 'workers'
+		threads. Images that cannot be processed are left out.
+
+		With fingerprint IDs the results are stored by fingerprint and
+		filename instead of the full path, so they can be reused for
+		images that have been moved.
+		"""
+		catalog = self.provider.catalog
+		section = 'emulators/' + self.image_info_handler_name
+		signatures = {}
 		for f in files:
-			(label, icon) = self.image_info_handler(f)
+			signature = stat_signature(f)
+			if signature is not None:
+				signatures[f] = signature
+
+		if self.fingerprint_ids:
+			missing = []
+			for (f, signature) in signatures.items():
+				fingerprint = catalog.get('emulators/fingerprint', f, None, signature) if catalog is not None else None
+				if fingerprint is None:
+					missing.append(f)
+				else:
+					self._fingerprints[f] = fingerprint
+			if len(missing) > 0:
+				LOGGER.info("Emulator/%s: Fingerprinting %d of %d images" % (self.label, len(missing), len(signatures)))
+				for (f, fingerprint) in self._run_batches(self._fingerprint_images, missing).items():
+					self._fingerprints[f] = fingerprint
+					if catalog is not None:
+						catalog.put('emulators/fingerprint', f, fingerprint, signatures[f])
+
+		infos = {}
+		keys = {}
+		missing = []
+		for (f, signature) in signatures.items():
+			keys[f] = self._catalog_key(f, signature)
+			info = catalog.get(section, keys[f][0], None, keys[f][1]) if catalog is not None else None
+			if info is None:
+				missing.append(f)
+			else:
+				infos[f] = tuple(info)
+
+		if len(missing) > 0:
+			LOGGER.info("Emulator/%s: Reading %d of %d images" % (self.label, len(missing), len(files)))
+			for (f, info) in self._run_batches(self._read_images, missing).items():
+				infos[f] = tuple(info)
+				if catalog is not None:
+					catalog.put(section, keys[f][0], info, keys[f][1])
+		return infos
+
+	def _catalog_key(self, f, signature):
+		""" Returns the catalog path and signature for an image's info """
+		fingerprint = self._fingerprints.get(f)
+		if fingerprint is None:
+			return (f, signature)
+		# The fingerprint includes the size, the filename is
+		# part of the key since handlers may depend on it. The
+		# key is not a path, so AppCatalog.save() keeps it.
+		return ('fingerprint:%s/%s' % (fingerprint, os.path.basename(f)), (0, signature[1]))
+
+	def _run_batches(self, func, paths):
+		""" Calls func() with chunks of BATCH_SIZE paths in a pool of at
+		most 'workers' threads. func() must return a list with one result
+		per path. Returns a dict of all paths with a result that is not None.
+		"""
+		results = {}
+		chunks = [paths[i:i + BATCH_SIZE] for i in range(0, len(paths), BATCH_SIZE)]
+		with ThreadPoolExecutor(max_workers=min(self.workers, len(chunks))) as executor:
+			for (chunk, values) in zip(chunks, executor.map(func, chunks)):
+				for (f, value) in zip(chunk, values):
+					if value is not None:
+						results[f] = value
+		return results
+
+	def _fingerprint_images(self, paths):
+		results = []
+		for f in paths:
+			try:
+				results.append(image_fingerprint(f))
+			except OSError as e:
+				LOGGER.warning("Emulator/%s: Failed to fingerprint '%s': %s" % (self.label, f, e))
+				results.append(None)
+		return results
+
+	def _read_images(self, paths):
+		""" Runs the batch function. If it fails the images are
+		processed one by one, so that a single broken image
+		does not affect the others.
+		"""
+		try:
+			results = self.image_info_batch(paths)
+			if len(results) == len(paths):
+				return results
+			LOGGER.warning("Emulator/%s: Image info handler returned %d results for %d images" % (self.label, len(results), len(paths)))
+		except:
+			LOGGER.exception("Emulator/%s: Failed to process %d images" % (self.label, len(paths)))
+
+		results = []
+		for f in paths:
+			try:
+				results.append(self.image_info_handler(f))
+			except:
+				LOGGER.exception("Emulator/%s: Failed to process '%s'" % (self.label, f))
+				results.append(None)
+		return results
+
+	def create_app(self, f, info):
+		""" Creates the AppItem for an image file """
+		(label, icon) = info
+		fingerprint = self._fingerprints.get(f)
+		if fingerprint is not None and self._id_owners.setdefault(fingerprint, f) == f:
+			id = fingerprint
+		else:
+			# Path based ID, also used for duplicates of fingerprinted images
 			sha_1 = hashlib.sha1()
 			sha_1.update(f.encode('utf-16be'))
 			id = sha_1.hexdigest()
 
-			# Build command...
-			has_placeholder = False
-			cmd = []
-			for part in self.command:
-				if part.find('%s') >= 0:
-					part = part.replace('%s', f)
-					has_placeholder = True
-				cmd.append(part)
-			if not has_placeholder:
-				cmd.append(f)
+		# Build command...
+		has_placeholder = False
+		cmd = []
+		for part in self.command:
+			if part.find('%s') >= 0:
+				part = part.replace('%s', f)
+				has_placeholder = True
+			cmd.append(part)
+		if not has_placeholder:
+			cmd.append(f)
 
-			if not icon:
-				icon = self.icon
+		# Local artwork is preferred over the icon found by the handler
+		icon = self.artwork.lookup(f) or icon or self.icon
 
-			apps.append(AppItem(id, label, icon, cmd=cmd, categories=[self.label]))
+		return AppItem(id, label, icon, cmd=cmd, categories=[self.label])
 
-		return apps
 
 class EmulatorProvider(AppProvider):
 	def __init__(self, settings):
 		AppProvider.__init__(self, settings)
+		# 'emulators.ini' is loaded on first use
+		self._emulatorIni = None
+		self._emulators = None
 
-		# Load 'emulators.ini'
-		self.emulators = []
-		self.emulatorIni = GamePlayConfig('emulators.ini')
-		for section in self.emulatorIni.sections():
-			try:
-				LOGGER.info('Loading emulator configuration for "%s"' % section)
-				self.emulators.append(Emulator(self.emulatorIni, section))
-			except:
-				LOGGER.exception('Failed to load config for emulator entry "%s"' % section)
+	@property
+	def emulatorIni(self):
+		if self._emulatorIni is None:
+			self._emulatorIni = GamePlayConfig('emulators.ini')
+		return self._emulatorIni
+
+	@property
+	def emulators(self):
+		if self._emulators is None:
+			emulators = []
+			watch = self.settings.getboolean(CONF_EMULATOR_SECTION, CONF_EMULATOR_WATCH, True)
+			workers = self.settings.getint(CONF_EMULATOR_SECTION, CONF_EMULATOR_WORKERS, DEFAULT_WORKERS)
+			for section in self.emulatorIni.sections():
+				try:
+					LOGGER.info('Loading emulator configuration for "%s"' % section)
+					emulators.append(Emulator(self, self.emulatorIni, section, watch, workers))
+				except:
+					LOGGER.exception('Failed to load config for emulator entry "%s"' % section)
+			self._emulators = emulators
+		return self._emulators
 
 	def get_apps(self):
 		""" Returns a EmulatorAppItem instance for each installed app """
@@ -8,22 +8,39 @@ import subprocess
 import re
 from PyQt5.QtCore import *
 from PyQt5.QtGui import QIcon
-from gameplay.AppProvider import AppProvider, AppItem
+from gameplay.AppProvider import AppProvider, AppItem, DEFAULT_PROVIDER_TIMEOUT
+from gameplay.executables import find_executable
+from gameplay.AppCatalog import stat_signature
 
 
 LOGGER = logging.getLogger(__name__)
 CONF_SCUMMVM_SECTION='providers/scummvm'
 CONF_SCUMMVM_ENABLED='enabled'
 CONF_SCUMMVM_EXECUTABLE='executable'
+CONF_SCUMMVM_TIMEOUT='timeout'
 
 class ScummvmPlatformGeneric:
 	def find_scummvm_exe(self):
 		LOGGER.warn('Method "find_scummvm_exe" not implemented')
 		return None
 
+	def find_config_file(self):
+		""" Returns the path of ScummVM's configuration file that
+		contains the list of targets, or None if unknown.
+		"""
+		return None
+
 class ScummvmPlatformLinux(ScummvmPlatformGeneric):
 	def find_scummvm_exe(self):
-		return [QStandardPaths.findExecutable('scummvm')]
+		return [find_executable('scummvm')]
+
+	def find_config_file(self):
+		configHome = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+		path = configHome + '/scummvm/scummvm.ini'
+		if os.path.exists(path):
+			return path
+		# Older versions
+		return os.path.expanduser('~/.scummvmrc')
 
 class ScummvmPlatformWindows(ScummvmPlatformGeneric):
 	def __init__(self):
@@ -40,7 +57,7 @@ class ScummvmPlatformWindows(ScummvmPlatformGeneric):
 		and inC:\\Program Files (x86)\\Scummvm\\scummvm.exe.
 		FIXME Use registry to look up real installation path.
 		"""
-		path = QStandardPaths.findExecutable('scummvm.exe')
+		path = find_executable('scummvm.exe')
 		if path:
 			return [path]
 			
@@ -52,6 +69,12 @@ class ScummvmPlatformWindows(ScummvmPlatformGeneric):
 
 		return None
 
+	def find_config_file(self):
+		appData = os.environ.get('APPDATA')
+		if appData:
+			return appData + os.sep + 'ScummVM' + os.sep + 'scummvm.ini'
+		return None
+
 
 class ScummvmPlatformOSX(ScummvmPlatformGeneric):
 	def find_scummvm_exe(self):
@@ -62,7 +85,7 @@ class ScummvmPlatformOSX(ScummvmPlatformGeneric):
 		
 		The result should be a list object
 		"""
-		path = QStandardPaths.findExecutable('Scummvm')
+		path = find_executable('Scummvm')
 		if path:
 			return [path]
 
@@ -73,6 +96,9 @@ class ScummvmPlatformOSX(ScummvmPlatformGeneric):
 
 		return None
 
+	def find_config_file(self):
+		return os.path.expanduser('~/Library/Preferences/ScummVM Preferences')
+
 class ScummvmAppItem(AppItem):
 	def __init__(self, provider, gameid, label, icon = None, icon_selected = None, suspended = False):
 		AppItem.__init__(self, 'scummvm_' + gameid, label, icon, icon_selected, suspended)
@@ -110,21 +136,61 @@ class ScummvmProvider(AppProvider):
 		""" Returns a ScummvmAppItem instance for each installed app """
 		apps = []
 		if self.settings.getboolean(CONF_SCUMMVM_SECTION, CONF_SCUMMVM_ENABLED, True):
-			cmd = self.find_scummvm_exe()
-			if cmd:
-				try:
-					cmd.append('-t')
-					for line in subprocess.check_output(cmd).splitlines():
-						line = line.decode('UTF-8')
-						m = self.target_pattern.match(line)
-						if m:
-							gameid = m.group(1)
-							label = m.group(2)
-							apps.append(ScummvmAppItem(self, gameid, label, self.find_icon(gameid)))
-				except:
-					LOGGER.exception('Failed to execute: %s' % (' '.join(cmd)))
+			configFile = self.platform.find_config_file()
+			signature = self.targets_signature(configFile) if configFile else None
+			if signature is not None:
+				# The list of targets only changes when the config file
+				# or the executable is modified
+				targets = self.cached('scummvm/targets', configFile, self.list_targets, signature)
+			else:
+				targets = self.list_targets()
+			for (gameid, label) in targets:
+				apps.append(ScummvmAppItem(self, gameid, label, self.find_icon(gameid)))
 		return apps
 
+	def targets_signature(self, configFile):
+		""" Returns the catalog signature of the config file combined
+		with the path and signature of the scummvm executable, or
+		None if either cannot be accessed.
+		"""
+		cmd = self.find_scummvm_exe()
+		if not cmd or not cmd[0]:
+			return None
+		config = stat_signature(configFile)
+		exe = stat_signature(cmd[0])
+		if config is None or exe is None:
+			return None
+		return (config[0], '%d:%s:%d:%d' % (config[1], cmd[0], exe[0], exe[1]))
+
+	def list_targets(self, configFile=None):
+		""" Returns a list of (gameid, label) tuples as reported by 'scummvm -t'.
+		Raises an exception if 'scummvm' fails, so that the result is
+		neither cached nor replaces the apps of the last scan.
+		"""
+		targets = []
+		cmd = self.find_scummvm_exe()
+		if not cmd or not cmd[0]:
+			LOGGER.info('ScummVM executable not found')
+			return targets
+		cmd = list(cmd) + ['-t']
+		# Don't leave a hanging process behind when the scan times out
+		timeout = self.settings.getfloat(CONF_SCUMMVM_SECTION, CONF_SCUMMVM_TIMEOUT, DEFAULT_PROVIDER_TIMEOUT)
+		try:
+			for line in subprocess.check_output(cmd, timeout=timeout if timeout > 0 else None).splitlines():
+				line = line.decode('UTF-8')
+				m = self.target_pattern.match(line)
+				if m:
+					targets.append((m.group(1), m.group(2)))
+		except subprocess.TimeoutExpired:
+			# check_output() has killed the process. The scanner keeps
+			# the apps of the last successful scan.
+			LOGGER.warning('%s did not finish within %.1f seconds' % (' '.join(cmd), timeout))
+			raise
+		except:
+			LOGGER.error('Failed to execute: %s' % (' '.join(cmd)))
+			raise
+		return targets
+
 	def find_icon(self, gameid):
 		""" Currently I do not have an idea how to find an image for the game.
 		In the meantime, define a Gameplay icon:// path that can be used by
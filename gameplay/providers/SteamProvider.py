@@ -2,14 +2,18 @@
 
 import os
 import sys
+import time
 import platform
 import logging
-import json
 import functools
 import psutil
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtCore import *
-from PyQt5.QtGui import QIcon
-from gameplay.AppProvider import AppProvider, AppItem
+from subprocess import Popen
+from gameplay.AppProvider import AppProvider, AppItem, AppProcess
+from gameplay import vdf
+from gameplay.AppCatalog import stat_signature
+from gameplay.executables import find_executable
 
 
 LOGGER = logging.getLogger(__name__)
@@ -17,6 +21,40 @@ CONF_STEAM_SECTION='providers/steam'
 CONF_STEAM_ENABLED='enabled'
 CONF_STEAM_EXECUTABLE='executable'
 CONF_STEAM_STEAMAPPS='steamapps'
+CONF_STEAM_LIBRARIES='libraries'
+CONF_STEAM_LAUNCH_MODE='launch-mode'
+CONF_STEAM_LAUNCH_TIMEOUT='launch-timeout'
+
+# Launch modes: 'resident' passes the game to a running Steam
+# client, 'restart' restarts Steam on every launch.
+LAUNCH_MODE_RESIDENT='resident'
+LAUNCH_MODE_RESTART='restart'
+DEFAULT_LAUNCH_TIMEOUT=60
+
+# Status reported while waiting for the game's process
+STATUS_STARTING='starting'
+
+# Minimum time in seconds between two searches for a game's process
+SEARCH_INTERVAL=1.0
+
+# Bits of the 'StateFlags' entry in app manifests (EAppState)
+STATE_UPDATE_REQUIRED = 0x2
+STATE_FULLY_INSTALLED = 0x4
+STATE_UPDATING = (0x100 | 0x200 | 0x400 | 0x10000 | 0x20000 | 0x40000 | 0x80000 | 0x100000 | 0x200000 | 0x400000)
+
+def install_state(manifest):
+	""" Returns 'installed', 'updating' or 'partial' depending on
+	the 'StateFlags' of an app manifest.
+	"""
+	try:
+		flags = int(manifest.get('StateFlags', STATE_FULLY_INSTALLED))
+	except ValueError:
+		flags = STATE_FULLY_INSTALLED
+	if flags & (STATE_UPDATING | STATE_UPDATE_REQUIRED):
+		return 'updating'
+	if not flags & STATE_FULLY_INSTALLED:
+		return 'partial'
+	return 'installed'
 
 def _str_to_int(s):
 	""" Converts a string that starts with a number to positive int.
@@ -61,6 +99,10 @@ class SteamPlatformGeneric:
 	def find_app_icon(self, appid):
 		LOGGER.warn('Method "find_app_icon" not implemented')
 		return None
+
+	def scan_icons(self):
+		""" Called before the icons of all apps are looked up """
+		pass
 	
 	def find_steam_exe(self):
 		LOGGER.warn('Method "find_steam_exe" not implemented')
@@ -78,14 +120,44 @@ class SteamPlatformLinux(SteamPlatformGeneric):
 			return steamPath.absolutePath()
 		return None
 
+	def __init__(self):
+		SteamPlatformGeneric.__init__(self)
+		self._icon_names = None
+
+	def scan_icons(self):
+		""" Collects the names of the icons that Steam has installed into
+		the 'hicolor' theme. This only lists directories, since QIcon must
+		not be used outside of the GUI thread. The icon itself is rendered
+		by get_icon_data() when the frontend requests it.
+		"""
+		names = set()
+		bases = [QDir.toNativeSeparators(path + '/icons') for path in QStandardPaths.standardLocations(QStandardPaths.GenericDataLocation)]
+		bases.append(os.path.expanduser('~/.icons'))
+		for base in bases:
+			theme = os.path.join(base, 'hicolor')
+			try:
+				sizes = [entry.path for entry in os.scandir(theme) if entry.is_dir()]
+			except OSError:
+				continue
+			for size in sizes:
+				try:
+					for entry in os.scandir(os.path.join(size, 'apps')):
+						if entry.name.startswith('steam_icon_'):
+							names.add(os.path.splitext(entry.name)[0])
+				except OSError:
+					pass
+		self._icon_names = names
+
 	def find_app_icon(self, appid):
 		iconName = 'steam_icon_' + appid
-		if not QIcon.fromTheme(iconName).isNull():
+		if self._icon_names is None:
+			self.scan_icons()
+		if iconName in self._icon_names:
 			return 'icon:///' + iconName
 		return None
 
 	def find_steam_exe(self):
-		return [QStandardPaths.findExecutable('steam')]
+		return [find_executable('steam')]
 
 class SteamPlatformWindows(SteamPlatformGeneric):
 	def __init__(self):
@@ -111,7 +183,7 @@ class SteamPlatformWindows(SteamPlatformGeneric):
 		and inC:\\Program Files (x86)\\Steam\\steam.exe.
 		FIXME Use registry to look up real installation path.
 		"""
-		path = QStandardPaths.findExecutable('steam.exe')
+		path = find_executable('steam.exe')
 		if path:
 			return [path]
 			
@@ -140,7 +212,7 @@ class SteamPlatformOSX(SteamPlatformGeneric):
 		
 		The result should be a list object
 		"""
-		path = QStandardPaths.findExecutable('Steam')
+		path = find_executable('Steam')
 		if path:
 			return [path]
 
@@ -152,18 +224,44 @@ class SteamPlatformOSX(SteamPlatformGeneric):
 		return None
 
 class SteamAppItem(AppItem):
-	def __init__(self, provider, manifest, icon = None, icon_selected = None, suspended = False):
+	def __init__(self, provider, manifest, icon = None, icon_selected = None, suspended = False, library = None, steam_exe = None):
 		AppItem.__init__(self, 'steam_' + manifest['appid'], manifest['name'], provider.find_icon(manifest), icon_selected, suspended)
 		self._appid = manifest['appid']
 		self._provider = provider
+		self._library = library
+		self._installdir = manifest.get('installdir')
 		self.categories = ['Steam App']
+		self.install_state = install_state(manifest)
 
-		cmd = self._provider.find_steam_exe()
-		if cmd:
-			cmd.append('steam://rungameid/%s' % (self._appid))
-			self.cmd = cmd
+		if steam_exe is None:
+			steam_exe = self._provider.find_steam_exe()
+		if steam_exe:
+			self.cmd = list(steam_exe) + ['steam://rungameid/%s' % (self._appid)]
 
 	def execute(self):
+		""" In 'resident' mode the game is started by the running Steam
+		client and a SteamAppProcess looks up the game's processes. In
+		'restart' mode any existing Steam instance is killed first,
+		so that the game becomes a child of our own process.
+		"""
+		settings = self._provider.settings
+		mode = settings.get(CONF_STEAM_SECTION, CONF_STEAM_LAUNCH_MODE, LAUNCH_MODE_RESIDENT)
+		if mode == LAUNCH_MODE_RESTART:
+			self.kill_steam()
+			return AppItem.execute(self)
+
+		if self.cmd is None:
+			return None
+		if mode != LAUNCH_MODE_RESIDENT:
+			LOGGER.warn('Unknown Steam launch mode "%s", using "%s"' % (mode, LAUNCH_MODE_RESIDENT))
+		installdir = None
+		if self._library and self._installdir:
+			installdir = os.path.join(self._library, 'common', self._installdir)
+		timeout = settings.getint(CONF_STEAM_SECTION, CONF_STEAM_LAUNCH_TIMEOUT, DEFAULT_LAUNCH_TIMEOUT)
+		LOGGER.info('Executing command "%s"' % ' '.join(self.cmd))
+		return SteamAppProcess(self.id, Popen(self.cmd), self._appid, installdir, timeout)
+
+	def kill_steam(self):
 		""" Kills any existing steam instance. Otherwise we would not be
 		able to do process control on the current application.
 		"""
@@ -171,14 +269,138 @@ class SteamAppItem(AppItem):
 		for proc in psutil.process_iter():
 			if proc.name().lower().find('steam') == 0:
 				LOGGER.info('Terminating Steam process %s (%d)' % (proc.name(), proc.pid))
-				killed_steam=True
 				proc.terminate()
 				procs.append(proc)
 		if len(procs) > 0:
 			# Wait a few seconds...
 			psutil.wait_procs(procs, timeout=5)
-		return AppItem.execute(self)
-	
+
+class SteamAppProcess(AppProcess):
+	""" A game started by a running Steam client. The command
+	'steam steam://rungameid/<appid>' only passes the request to the
+	client, so the game's process tree is looked up afterwards. A process
+	belongs to the game if its 'SteamAppId' environment variable or an
+	'AppId=<appid>' argument (Steam's launch wrapper) matches, or if its
+	working directory is below the app's installation directory.
+
+	Until the game has been found it is reported as active with status
+	'starting'. If it doesn't show up within 'timeout' seconds the
+	launch is considered to have failed.
+	"""
+
+	def __init__(self, appid, launcher, steam_appid, installdir=None, timeout=DEFAULT_LAUNCH_TIMEOUT):
+		AppProcess.__init__(self, appid, launcher)
+		self.steam_appid = str(steam_appid)
+		self.installdir = os.path.normcase(os.path.realpath(installdir)) if installdir else None
+		self._started = time.time()
+		self._deadline = time.monotonic() + timeout
+		self._next_search = 0
+		self._found = False
+
+	def _pending(self, force=False):
+		""" Searches for the game's process if it hasn't been found yet.
+		Returns True as long as we are still waiting for it.
+		"""
+		if self._found:
+			return False
+		if self.popen is not None:
+			# Reap the launcher
+			self.popen.poll()
+		now = time.monotonic()
+		if now >= self._deadline:
+			return False
+		if force or now >= self._next_search:
+			self._next_search = now + SEARCH_INTERVAL
+			proc = self._find_game()
+			if proc is not None:
+				LOGGER.info("Found process %d of Steam app %s" % (proc.pid, self.steam_appid))
+				self.process = proc
+				self.pid = proc.pid
+				self.popen = None
+				self._found = True
+				return False
+			if time.monotonic() >= self._deadline:
+				LOGGER.warn("Steam app %s did not start" % self.steam_appid)
+				return False
+		return True
+
+	def _find_game(self):
+		""" Returns the topmost process of the game's process tree or None """
+		matches = {}
+		for proc in psutil.process_iter():
+			try:
+				# Ignore processes started before the launch, e.g. Steam itself
+				if proc.create_time() >= self._started - 1 and self._matches(proc):
+					matches[proc.pid] = proc
+			except (psutil.NoSuchProcess, psutil.AccessDenied):
+				pass
+		for proc in matches.values():
+			try:
+				if proc.ppid() not in matches:
+					return proc
+			except psutil.NoSuchProcess:
+				pass
+		return None
+
+	def _matches(self, proc):
+		if 'AppId=' + self.steam_appid in proc.cmdline():
+			return True
+		try:
+			if proc.environ().get('SteamAppId') == self.steam_appid:
+				return True
+		except psutil.AccessDenied:
+			pass
+		if self.installdir is not None:
+			cwd = os.path.normcase(proc.cwd())
+			return cwd == self.installdir or cwd.startswith(self.installdir + os.sep)
+		return False
+
+	def is_running(self):
+		if self._pending():
+			return True
+		return self._found and AppProcess.is_running(self)
+
+	def status(self):
+		if self._pending():
+			return STATUS_STARTING
+		if not self._found:
+			return psutil.STATUS_DEAD
+		return AppProcess.status(self)
+
+	def snapshot(self):
+		if self._pending():
+			return { 'active': True, 'suspended': False, 'status': STATUS_STARTING }
+		if not self._found:
+			return { 'active': False, 'suspended': False, 'status': psutil.STATUS_DEAD }
+		return AppProcess.snapshot(self)
+
+	def send_terminate(self):
+		if self._pending(True):
+			# The launcher might be the Steam client itself, leave it alone
+			LOGGER.info("Steam app %s has not been started yet, giving up" % self.steam_appid)
+			self._deadline = 0
+			return False
+		return self._found and AppProcess.send_terminate(self)
+
+	def send_kill(self):
+		if self._found:
+			AppProcess.send_kill(self)
+
+	def terminated(self):
+		return not self._found or AppProcess.terminated(self)
+
+	def suspend(self):
+		if self._pending(True):
+			LOGGER.info("Steam app %s has not been started yet, cannot suspend it" % self.steam_appid)
+		elif self._found:
+			AppProcess.suspend(self)
+
+	def resume(self, raiseCallback = None):
+		if self._found:
+			AppProcess.resume(self, raiseCallback)
+		elif raiseCallback is not None:
+			raiseCallback()
+
 class SteamProvider(AppProvider):
 	def __init__(self, settings):
 		AppProvider.__init__(self, settings)
@@ -199,14 +421,122 @@ class SteamProvider(AppProvider):
 		if not self.path:
 			self.path = self.platform.steamapps_path()
 
+		# Installed manifests per library, see _scan_library()
+		self._library_cache = {}
+
 	def get_apps(self):
 		""" Returns a SteamAppItem instance for each installed app """
 		apps = []
 		if self.settings.getboolean(CONF_STEAM_SECTION, CONF_STEAM_ENABLED, True):
-			for manifest in self.list_installed_app_manifests():
-				apps.append(SteamAppItem(self, manifest))
+			steam_exe = self.find_steam_exe()
+			self.platform.scan_icons()
+			for (library, manifest) in self.list_installed_apps():
+				apps.append(SteamAppItem(self, manifest, library=library, steam_exe=steam_exe))
+		return apps
+
+	def list_libraries(self):
+		""" Returns the "steamapps" directories of all Steam libraries. These
+		are the main "steamapps" directory, the libraries listed in its
+		'libraryfolders.vdf' and those configured as 'libraries'.
+		"""
+		if not self.path:
+			return []
+
+		roots = []
+		try:
+			folders = vdf.load(self.path + os.sep + 'libraryfolders.vdf')
+			for (key, section) in folders.items():
+				if key.lower() != 'libraryfolders' or not isinstance(section, dict):
+					continue
+				for (index, folder) in section.items():
+					if isinstance(folder, dict):
+						# Current format: "0" { "path" "..." ... }
+						folder = folder.get('path')
+					elif not index.isdigit():
+						# Old format also contains "TimeNextStatsReport" etc.
+						folder = None
+					if folder:
+						roots.append(folder)
+		except FileNotFoundError:
+			pass
+		except (OSError, vdf.VDFError) as e:
+			LOGGER.warn("Failed to parse libraryfolders.vdf in " + self.path + ": " + str(e))
+		roots += self.settings.getlist(CONF_STEAM_SECTION, CONF_STEAM_LIBRARIES, [])
+
+		libraries = [self.path]
+		seen = set([os.path.normcase(os.path.realpath(self.path))])
+		for root in roots:
+			for name in ['steamapps', 'SteamApps']:
+				path = os.path.join(os.path.expanduser(root), name)
+				if os.path.isdir(path):
+					key = os.path.normcase(os.path.realpath(path))
+					if key not in seen:
+						seen.add(key)
+						libraries.append(path)
+					break
+		return libraries
+
+	def list_installed_apps(self):
+		""" Returns a list of (library, manifest) tuples for all installed
+		apps in all libraries. The libraries are scanned concurrently.
+		If an app is installed in more than one library the first
+		library wins.
+		"""
+		libraries = self.list_libraries()
+		if len(libraries) == 0:
+			LOGGER.warn('No "steamapps" directory configured')
+			return []
+
+		with ThreadPoolExecutor(max_workers=len(libraries)) as executor:
+			results = list(executor.map(self._scan_library, libraries))
+
+		apps = []
+		seen = set()
+		for (library, manifests) in zip(libraries, results):
+			for manifest in manifests:
+				appid = manifest.get('appid')
+				if appid and appid not in seen:
+					seen.add(appid)
+					apps.append((library, manifest))
 		return apps
 
+	def _library_signature(self, path):
+		""" Returns the stat signatures of the library's "common" directory
+		and of all app manifests. A manifest is rewritten in place when its
+		state changes (e.g. during an update), which doesn't change the
+		mtime of the "steamapps" directory.
+		"""
+		manifests = []
+		try:
+			for entry in os.scandir(path):
+				if entry.name.startswith('appmanifest_') and entry.name.endswith('.acf'):
+					try:
+						st = entry.stat()
+						manifests.append((entry.name, st.st_mtime_ns, st.st_size))
+					except OSError:
+						pass
+		except OSError:
+			return None
+		manifests.sort()
+		return (stat_signature(path + os.sep + 'common'), tuple(manifests))
+
+	def _scan_library(self, path):
+		""" Returns the installed app manifests of a single library. The result
+		is reused as long as the app manifests and the mtime of the library's
+		"common" directory don't change.
+		"""
+		signature = self._library_signature(path)
+		cached = self._library_cache.get(path)
+		if cached is not None and signature is not None and cached[0] == signature:
+			return cached[1]
+		try:
+			manifests = self.list_installed_app_manifests(path)
+		except:
+			LOGGER.exception('Failed to scan Steam library "%s"' % path)
+			return []
+		self._library_cache[path] = (signature, manifests)
+		return manifests
+
 	def find_icon(self, appid):
 		""" Tries to locate the application icon (in maximal resolution)
 		for a given app id. This is platform dependent.
@@ -239,10 +569,10 @@ class SteamProvider(AppProvider):
 		appid = str(int(appid))
 		return 'https://steamcdn-a.akamaihd.net/steam/apps/' + appid + '/header.jpg'
 
-	def list_all_app_manifests(self):
-		"""Parses all .acf-Files in steamapps directory. ACF files
-		are similar to JSON files, to I'm just change the syntax
-		and use python's json_decode for parsing.
+	def list_all_app_manifests(self, steamapps=None):
+		"""Parses all .acf-Files in a steamapps directory (default: the
+		main "steamapps" directory). ACF files
+		use Valve's text VDF format, see gameplay.vdf.
 		
 		Example:
 			"AppState"
@@ -254,69 +584,57 @@ class SteamProvider(AppProvider):
 					"key2"		"value2"
 				}
 			}
-		
-		Will be transformed to:
-			{
-				"appid": "1234",
-				"section": {
-					"key1": "value1",
-					"key2": "value2"
-				}
-			}
 		"""
-		path = QDir(self.path)
-		if path is None:
+		if steamapps is None:
+			steamapps = self.path
+		if steamapps is None:
 			LOGGER.warn('No "steamapps" directory configured')
 			return []
 
-		if not path.exists():
-			LOGGER.warn('Directory not found: steamapps="%s"', path.absolutePath())
+		try:
+			entries = [entry.name for entry in os.scandir(steamapps)]
+		except OSError:
+			LOGGER.warn('Directory not found: steamapps="%s"', steamapps)
 			return []
 
 		manifests = []
-		for fname in path.entryList(['*.acf']):
-			fname = QDir.toNativeSeparators(self.path + "/" + fname)
-			with open(fname) as f:
-				json_contents = '{'
-				level = 1;
-				comma = ''
-				for line in f:
-					line = line.strip()
-					if line == '{':
-						json_contents += ": {\n"
-						comma = ''
-						level += 1
-					elif line == '}':
-						level -= 1
-						json_contents += "\n" + ("\t" * level) + "} "
-						comma = ','
-					else:
-						tabIndex = line.find("\"\t")
-						if tabIndex > 0:
-							line = line[:tabIndex+1] + ':' + line[tabIndex+2:]
-						json_contents += comma + "\n" + ("\t" * level) + line
-						comma = ','
-				json_contents += "\n}"
-				try:
-					data = json.loads(json_contents)
-					if data:
-						appState = data.get('AppState')
-						if appState:
-							manifests.append(appState)
-				except json.decoder.JSONDecodeError as e:
-					LOGGER.warn("Failed to parse app manifest at " + fname + ": " + str(e))
+		for fname in entries:
+			if fname.endswith('.acf'):
+				fname = QDir.toNativeSeparators(steamapps + "/" + fname)
+				appState = self.cached('steam/manifests', fname, self.parse_app_manifest)
+				if appState:
+					manifests.append(appState)
 		return manifests
+
+	def parse_app_manifest(self, fname):
+		""" Parses a single .acf file and returns its 'AppState'
+		section or None.
+		"""
+		try:
+			return vdf.load(fname).get('AppState')
+		except (OSError, vdf.VDFError) as e:
+			LOGGER.warn("Failed to parse app manifest at " + fname + ": " + str(e))
+		return None
 	
-	def list_installed_app_manifests(self):
-		""" List all manifests from apps that seem to be installed. """
-		manifests = self.list_all_app_manifests()
+	def list_installed_app_manifests(self, steamapps=None):
+		""" List all manifests from apps that seem to be installed. The
+		"common" directory is listed once and matched against the
+		manifests' 'installdir' values. Use install_state() to find
+		out if an app is completely installed.
+		"""
+		if steamapps is None:
+			steamapps = self.path
+		manifests = self.list_all_app_manifests(steamapps)
+		try:
+			install_dirs = set(os.path.normcase(entry.name) for entry in os.scandir(steamapps + os.sep + 'common') if entry.is_dir())
+		except OSError:
+			return []
+
 		installed = []
 		for app in manifests:
 			install_dir = app.get('installdir')
-			if install_dir:
-				install_dir = QDir(self.path + '/common/' + install_dir)
-				if install_dir.exists():
-					installed.append(app)
+			if install_dir and os.path.normcase(install_dir) in install_dirs:
+				installed.append(app)
 		return installed
 
 #  vim: set fenc=utf-8 ts=4 sw=4 noet :
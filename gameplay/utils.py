@@ -1,30 +1,101 @@
 import os
 import sys
+import time
+import hashlib
 import logging
+import configparser
 import mimetypes
+import functools
 from PyQt5.QtGui import QIcon
 from PyQt5.QtCore import QByteArray, QBuffer, QIODevice, QDir, QStandardPaths
+from .IconCache import IconCache
+from .AppCatalog import stat_signature
+from .platform import system_module
 
 LOGGER = logging.getLogger(__name__)
 
-# Load platform dependent utils
-import platform
-system = platform.system()
-if system == 'Linux':
-	LOGGER.info('Detected Linux system')
-	from .platform import linux as gameplay_sys
-elif system == 'Darwin':
-	LOGGER.info('Detected Darwin system')
-	from .platform import darwin as gameplay_sys
-elif system == 'Windows':
-	LOGGER.info('Detected Windows system')
-	from .platform import windows as gameplay_sys
-else:
-	# Try with linux as fallback...
-	LOGGER.info('Detected unknown system, using Linux API')
-	from .platform import linux as gameplay_sys
-
 ICON_OVERRIDE_PATHS = None
+ICON_CACHE = None
+
+# Seconds for which the signature of the icon theme is reused
+THEME_SIGNATURE_TTL = 10
+
+# (theme name, expiry, signature), see _theme_signature()
+_THEME_SIGNATURE = None
+
+def _image_type(path):
+	""" Returns the mime type of path if it is an image file """
+	(mimeType, encoding) = mimetypes.guess_type(path)
+	if mimeType is not None and mimeType.startswith('image/'):
+		return mimeType
+	return None
+
+def _read_image(path, mimeType):
+	with open(path, 'rb') as f:
+		return (f.read(), mimeType)
+
+def _read_theme_index(path):
+	""" Returns the 'Directories' and 'Inherits' lists of an
+	index.theme file or None if it cannot be read.
+	"""
+	index = configparser.ConfigParser(interpolation=None, strict=False)
+	try:
+		with open(path, encoding='UTF-8', errors='replace') as f:
+			index.read_file(f)
+	except (OSError, configparser.Error):
+		return None
+	directories = index.get('Icon Theme', 'Directories', fallback='') + ',' + index.get('Icon Theme', 'ScaledDirectories', fallback='')
+	inherits = index.get('Icon Theme', 'Inherits', fallback='')
+	return ([d.strip() for d in directories.split(',') if d.strip()], [t.strip() for t in inherits.split(',') if t.strip()])
+
+def _theme_signature():
+	""" Identifies the current icon theme by its name and the mtimes of
+	all icon directories of the theme and the themes it inherits from,
+	including the 'hicolor' fallback, so that installing or updating
+	an icon changes the signature. The result is reused for
+	THEME_SIGNATURE_TTL seconds.
+	"""
+	global _THEME_SIGNATURE
+	name = QIcon.themeName()
+	now = time.monotonic()
+	if _THEME_SIGNATURE is not None and _THEME_SIGNATURE[0] == name and _THEME_SIGNATURE[1] > now:
+		return _THEME_SIGNATURE[2]
+
+	paths = QIcon.themeSearchPaths()
+	themes = [name, 'hicolor'] if name != 'hicolor' else [name]
+	mtimes = []
+	i = 0
+	while i < len(themes):
+		theme = themes[i]
+		i += 1
+		for path in paths:
+			root = os.path.join(path, theme)
+			index = _read_theme_index(os.path.join(root, 'index.theme'))
+			if index is None:
+				continue
+			for directory in index[0]:
+				signature = stat_signature(os.path.join(root, directory))
+				if signature is not None:
+					mtimes.append((theme, directory, signature[0]))
+			for parent in index[1]:
+				if parent not in themes:
+					themes.append(parent)
+	signature = (name, hashlib.sha1(repr(mtimes).encode('UTF-8')).hexdigest())
+	_THEME_SIGNATURE = (name, now + THEME_SIGNATURE_TTL, signature)
+	return signature
+
+def _render_theme_icon(iconName):
+	icon = QIcon.fromTheme(iconName)
+	sizes = sorted(icon.availableSizes(), key=lambda s : s.width() * s.height(), reverse=True)
+	if len(sizes) > 0:
+		image = icon.pixmap(sizes[0]).toImage()
+		ba = QByteArray();
+		buf = QBuffer(ba);
+		buf.open(QIODevice.WriteOnly);
+		image.save(buf, 'PNG')
+		return (ba.data(), 'image/png')
+	return (None, None)
+
 def get_icon_data(iconName):
 	""" Resolves an icon name and returns its data and filetype.
 	Returns None / None if the image has not  been found.
@@ -37,43 +108,34 @@ def get_icon_data(iconName):
 	If anything fails this call will be redirected to a platform
 	dependent implementation. On windows, this will try to extract
 	the first icon from an .exe file.
+
+	Results are kept in an IconCache. Image files are revalidated
+	by their mtime and size, rendered theme icons are also stored
+	on disk and invalidated when an icon directory of the theme changes.
 	"""
-	global ICON_OVERRIDE_PATHS
+	global ICON_OVERRIDE_PATHS, ICON_CACHE
 	if ICON_OVERRIDE_PATHS is None:
 		# Load local icon override paths
 		ICON_OVERRIDE_PATHS = [os.path.dirname(os.path.abspath(sys.argv[0])) + os.sep + 'icons']
 		ICON_OVERRIDE_PATHS += [QDir.toNativeSeparators(x + '/icons') for x in QStandardPaths.standardLocations(QStandardPaths.AppConfigLocation)]
-
-	for override in ICON_OVERRIDE_PATHS:
-		override += os.sep + iconName
-		print(override)
-		if os.path.exists(override):
-			(mimeType, encoding) = mimetypes.guess_type(override)
-			if mimeType is not None and mimeType.startswith('image/'):
-				buf = open(override, 'rb').read()
-				return (buf, mimeType)
-
-	if os.path.exists(iconName):
-		(mimeType, encoding) = mimetypes.guess_type(iconName)
-		if mimeType is not None and mimeType.startswith('image/'):
-			buf = open(iconName, 'rb').read()
-			return (buf, mimeType)
-
-	icon = QIcon.fromTheme(iconName)
-	sizes = sorted(icon.availableSizes(), key=lambda s : s.width() * s.height(), reverse=True)
-	if len(sizes) > 0:
-		image = icon.pixmap(sizes[0]).toImage()
-		ba = QByteArray();
-		buf = QBuffer(ba);
-		buf.open(QIODevice.WriteOnly);
-		image.save(buf, 'PNG')
-		return (ba.data(), 'image/png')
-	else:
-		(icon, contentType) = gameplay_sys.find_icon_by_name(iconName)
+	if ICON_CACHE is None:
+		ICON_CACHE = IconCache()
+
+	for path in [override + os.sep + iconName for override in ICON_OVERRIDE_PATHS] + [iconName]:
+		signature = stat_signature(path)
+		if signature is not None:
+			mimeType = _image_type(path)
+			if mimeType is not None:
+				return ICON_CACHE.get(('file', path), signature, functools.partial(_read_image, path, mimeType))
+
+	theme = _theme_signature()
+	(icon, contentType) = ICON_CACHE.get(('theme', iconName), theme, functools.partial(_render_theme_icon, iconName), persist=True)
+	if icon is None:
+		(icon, contentType) = ICON_CACHE.get(('platform', iconName), theme, functools.partial(system_module().find_icon_by_name, iconName))
 		if icon is None:
 			LOGGER.warning("Icon not found: %s" % (iconName))
 			return (None, None)
-		return (icon, contentType)
+	return (icon, contentType)
 
 def find_getch():
 	""" Returns a getch (get character) implementation """
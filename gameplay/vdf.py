@@ -0,0 +1,238 @@
+"""
+Parser for Valve's KeyValues (VDF) formats as used by Steam.
+
+Supported are the text format (.acf app manifests, libraryfolders.vdf,
+config.vdf), the binary format (shortcuts.vdf) and the binary app info
+cache (appinfo.vdf, versions 27 to 29).
+
+The load functions cache their results by (path, mtime, size), so
+unchanged files are never parsed twice. The returned dicts are shared
+between callers and must not be modified.
+"""
+
+import os
+import re
+import struct
+import threading
+
+class VDFError(ValueError):
+	pass
+
+_TOKENS = re.compile(r'''
+	(?P<space>\s+|//[^\n]*) |
+	"(?P<string>(?:[^"\\]|\\.)*)" |
+	(?P<open>\{) |
+	(?P<close>\}) |
+	(?P<condition>\[[^\]\n]*\]) |
+	(?P<word>[^\s{}"]+) |
+	(?P<error>.)
+''', re.VERBOSE | re.DOTALL)
+
+_ESCAPES = re.compile(r'\\(.)', re.DOTALL)
+_ESCAPE_CHARS = { 'n': '\n', 't': '\t', 'r': '\r' }
+
+def _unescape(value):
+	if '\\' not in value:
+		return value
+	return _ESCAPES.sub(lambda m: _ESCAPE_CHARS.get(m.group(1), m.group(1)), value)
+
+def loads(text):
+	""" Parses a text VDF document into nested dicts. Conditionals like
+	[$WIN32] are ignored. If a key occurs more than once the last value
+	wins; nested sections with the same key are merged.
+	"""
+	root = {}
+	stack = [root]
+	key = None
+	for m in _TOKENS.finditer(text):
+		kind = m.lastgroup
+		if kind == 'space' or kind == 'condition':
+			continue
+		elif kind == 'string' or kind == 'word':
+			value = _unescape(m.group(kind)) if kind == 'string' else m.group(kind)
+			if key is None:
+				key = value
+			else:
+				stack[-1][key] = value
+				key = None
+		elif kind == 'open':
+			if key is None:
+				raise VDFError('Unexpected "{" at offset %d' % m.start())
+			section = stack[-1].get(key)
+			if not isinstance(section, dict):
+				section = {}
+				stack[-1][key] = section
+			stack.append(section)
+			key = None
+		elif kind == 'close':
+			if len(stack) == 1:
+				raise VDFError('Unexpected "}" at offset %d' % m.start())
+			stack.pop()
+			key = None
+		else:
+			raise VDFError('Unexpected character at offset %d' % m.start())
+	if len(stack) != 1:
+		raise VDFError('Unexpected end of document')
+	return root
+
+# Binary type markers
+_BIN_MAP = 0x00
+_BIN_STRING = 0x01
+_BIN_INT32 = 0x02
+_BIN_FLOAT32 = 0x03
+_BIN_POINTER = 0x04
+_BIN_WIDESTRING = 0x05
+_BIN_COLOR = 0x06
+_BIN_UINT64 = 0x07
+_BIN_END = 0x08
+_BIN_INT64 = 0x0A
+_BIN_END_ALT = 0x0B
+
+_INT32 = struct.Struct('<i')
+_UINT32 = struct.Struct('<I')
+_UINT64 = struct.Struct('<Q')
+_INT64 = struct.Struct('<q')
+_FLOAT32 = struct.Struct('<f')
+
+def _read_cstring(data, offset):
+	end = data.find(b'\0', offset)
+	if end < 0:
+		raise VDFError('Unterminated string at offset %d' % offset)
+	return (data[offset:end].decode('UTF-8', 'replace'), end + 1)
+
+def _read_widestring(data, offset):
+	end = offset
+	while end + 1 < len(data) and data[end:end + 2] != b'\0\0':
+		end += 2
+	return (data[offset:end].decode('UTF-16LE', 'replace'), end + 2)
+
+def _binary_map(data, offset, keys):
+	""" Parses a binary map starting at offset. Returns
+	the dict and the offset after its end marker.
+	"""
+	result = {}
+	while True:
+		if offset >= len(data):
+			raise VDFError('Unexpected end of binary document')
+		kind = data[offset]
+		offset += 1
+		if kind == _BIN_END or kind == _BIN_END_ALT:
+			return (result, offset)
+
+		if keys is None:
+			(key, offset) = _read_cstring(data, offset)
+		else:
+			key = keys[_UINT32.unpack_from(data, offset)[0]]
+			offset += 4
+
+		if kind == _BIN_MAP:
+			(value, offset) = _binary_map(data, offset, keys)
+		elif kind == _BIN_STRING:
+			(value, offset) = _read_cstring(data, offset)
+		elif kind == _BIN_WIDESTRING:
+			(value, offset) = _read_widestring(data, offset)
+		elif kind == _BIN_INT32 or kind == _BIN_POINTER or kind == _BIN_COLOR:
+			value = _INT32.unpack_from(data, offset)[0]
+			offset += 4
+		elif kind == _BIN_FLOAT32:
+			value = _FLOAT32.unpack_from(data, offset)[0]
+			offset += 4
+		elif kind == _BIN_UINT64:
+			value = _UINT64.unpack_from(data, offset)[0]
+			offset += 8
+		elif kind == _BIN_INT64:
+			value = _INT64.unpack_from(data, offset)[0]
+			offset += 8
+		else:
+			raise VDFError('Unknown type 0x%02x at offset %d' % (kind, offset - 1))
+		result[key] = value
+
+def binary_loads(data, keys=None):
+	""" Parses a binary VDF document (e.g. shortcuts.vdf). If 'keys'
+	is given, keys are stored as indices into this list.
+	"""
+	return _binary_map(data, 0, keys)[0]
+
+_APPINFO_V27 = 0x07564427
+_APPINFO_V28 = 0x07564428
+_APPINFO_V29 = 0x07564429
+
+def appinfo_loads(data):
+	""" Parses Steam's appinfo.vdf cache. Returns a dict that maps
+	app ids to dicts with the keys 'last_updated', 'change_number'
+	and 'data' (the app's parsed key values).
+	"""
+	(magic, universe) = struct.unpack_from('<II', data, 0)
+	offset = 8
+	keys = None
+	end = len(data)
+	if magic == _APPINFO_V29:
+		# Keys are stored in a string table at the end of the file
+		end = _INT64.unpack_from(data, offset)[0]
+		offset += 8
+		count = _UINT32.unpack_from(data, end)[0]
+		keys = []
+		pos = end + 4
+		for i in range(count):
+			(key, pos) = _read_cstring(data, pos)
+			keys.append(key)
+	elif magic != _APPINFO_V27 and magic != _APPINFO_V28:
+		raise VDFError('Unsupported appinfo.vdf version 0x%08x' % magic)
+
+	# appid, size, info_state, last_updated, pics_token, sha1, change_number
+	header = struct.Struct('<IIIIQ20sI')
+	if magic != _APPINFO_V27:
+		# ... binary_sha1
+		header = struct.Struct('<IIIIQ20sI20s')
+
+	apps = {}
+	while offset + 4 <= end:
+		appid = _UINT32.unpack_from(data, offset)[0]
+		if appid == 0:
+			break
+		fields = header.unpack_from(data, offset)
+		# 'size' counts the bytes after the size field
+		next_offset = offset + 8 + fields[1]
+		apps[appid] = {
+			'last_updated': fields[3],
+			'change_number': fields[6],
+			'data': _binary_map(data, offset + header.size, keys)[0]
+		}
+		offset = next_offset
+	return apps
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+def _load_cached(path, mode, parser):
+	st = os.stat(path)
+	key = (path, mode)
+	with _CACHE_LOCK:
+		entry = _CACHE.get(key)
+		if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+			return entry[2]
+
+	if mode == 'text':
+		with open(path, encoding='UTF-8', errors='replace') as f:
+			result = parser(f.read())
+	else:
+		with open(path, 'rb') as f:
+			result = parser(f.read())
+
+	with _CACHE_LOCK:
+		_CACHE[key] = (st.st_mtime_ns, st.st_size, result)
+	return result
+
+def load(path):
+	""" Parses a text VDF file, see loads() """
+	return _load_cached(path, 'text', loads)
+
+def binary_load(path):
+	""" Parses a binary VDF file, see binary_loads() """
+	return _load_cached(path, 'binary', binary_loads)
+
+def appinfo_load(path):
+	""" Parses appinfo.vdf, see appinfo_loads() """
+	return _load_cached(path, 'appinfo', appinfo_loads)
+
+#  vim: set fenc=utf-8 ts=4 sw=4 noet :
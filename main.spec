@@ -7,7 +7,18 @@ a = Analysis(['main.py'],
              pathex=['/home/roland/development/privat/gameplay'],
              binaries=[],
              datas=[],
-             hiddenimports=[],
+             hiddenimports=[
+                 # Imported on demand by ProviderRegistry
+                 'gameplay.providers.SteamProvider',
+                 'gameplay.providers.EmulatorProvider',
+                 'gameplay.providers.DesktopEntryProvider',
+                 'gameplay.providers.SystemAppProvider',
+                 'gameplay.providers.ScummvmProvider',
+                 # Imported on demand by platform.system_module()
+                 'gameplay.platform.linux',
+                 'gameplay.platform.darwin',
+                 'gameplay.platform.windows'
+             ],
              hookspath=[],
              runtime_hooks=[],
              excludes=[],
@@ -12,6 +12,7 @@
 						icon: data.icon,
 						icon_selected: data.icon_selected,
 						categories: data.categories || [],
+						install_state: data.install_state || 'installed',
 						favourite: ko.computed({
 							read: function() {
 								return favourites.ready() ? favourites().indexOf(data.id) >= 0 : false;
@@ -99,6 +100,85 @@
 					return observable;
 				}
 
+				/**
+				* Fetches a JSON resource from the 'gameplay://api/' url scheme. The
+				* response of resources without a query is kept and its ETag is sent
+				* with the next request, so unchanged data is answered with 304.
+				*
+				* If the scheme cannot be used the backend method given as second
+				* parameter is called with the remaining arguments instead.
+				**/
+				var apiAvailable = window.XMLHttpRequest !== undefined;
+				var apiCache = {};
+				function apiRequest(resource, method) {
+					var args = Array.prototype.slice.call(arguments, 1);
+					var result;
+					var listeners = [];
+					var resolve = function(value) {
+						result = value;
+						for (var i = 0; i < listeners.length; i+=1) {
+							listeners[i].call(listeners[i], result);
+						}
+						listeners = undefined;
+					};
+					var fallback = function() {
+						externalRequest.apply(undefined, args).done(resolve);
+					};
+
+					if (apiAvailable) {
+						var url = 'gameplay://api/' + resource;
+						var cached = apiCache[url];
+						var xhr = new XMLHttpRequest();
+						xhr.onreadystatechange = function() {
+							if (xhr.readyState !== 4) {
+								return;
+							}
+							if (xhr.status === 304 && cached !== undefined) {
+								return resolve(cached.data);
+							}
+							var data;
+							try {
+								if ((xhr.status !== 200 && xhr.status !== 0) || !xhr.responseText) {
+									throw new Error('HTTP status ' + xhr.status);
+								}
+								data = JSON.parse(xhr.responseText);
+							} catch (err) {
+								console.log("warn: Failed to fetch " + url + ", using the bridge instead: " + err);
+								apiAvailable = false;
+								return fallback();
+							}
+							var etag = xhr.getResponseHeader('ETag');
+							if (etag && resource.indexOf('?') < 0) {
+								apiCache[url] = { etag: etag, data: data };
+							}
+							resolve(data);
+						};
+						try {
+							xhr.open('GET', url, true);
+							if (cached !== undefined) {
+								xhr.setRequestHeader('If-None-Match', cached.etag);
+							}
+							xhr.send();
+						} catch (err) {
+							apiAvailable = false;
+							fallback();
+						}
+					} else {
+						fallback();
+					}
+
+					return {
+						done: function(listener) {
+							if (listeners === undefined) {
+								listener.call(listener, result);
+							} else {
+								listeners.push(listener);
+							}
+							return this;
+						}
+					};
+				}
+
 				return function(viewModel) {
 					var hiddenCategories = new PersistantObservableArray('apps', 'hidden-categories');
 					var hiddenApps = new PersistantObservableArray('apps', 'hidden-apps');
@@ -107,14 +187,127 @@
 
 					var rawApps = ko.observableArray();
 					rawApps.ready = ko.observable(false);
-					externalRequest('getApps').done(function(list) {
-						var result = [];
-						for (var i = 0; i < list.length; i+=1) {
-							result.push(new AppItem(list[i], hiddenApps, favouriteApps));
+					rawApps.scanning = ko.observable(false);
+
+					var compareApps = function(a, b) {
+						if (a.label.toLowerCase() < b.label.toLowerCase()) return -1;
+						if (a.label.toLowerCase() > b.label.toLowerCase()) return 1;
+						return 0;
+					};
+
+					/**
+					* Adds new apps or replaces existing ones with the same id.
+					**/
+					var addApps = function(list) {
+						var i, result = rawApps.peek().slice(), indexes = {};
+						for (i = 0; i < result.length; i+=1) {
+							indexes[result[i].id] = i;
+						}
+						for (i = 0; i < list.length; i+=1) {
+							var item = new AppItem(list[i], hiddenApps, favouriteApps);
+							if (indexes[item.id] === undefined) {
+								indexes[item.id] = result.length;
+							}
+							result[indexes[item.id]] = item;
 						}
+						result.sort(compareApps);
 						rawApps(result);
 						rawApps.ready(true);
-					});
+					};
+
+					/**
+					* Removes apps by their ids.
+					**/
+					var removeApps = function(ids) {
+						rawApps(rawApps.peek().filter(function(app) {
+							return ids.indexOf(app.id) < 0;
+						}));
+					};
+
+					/**
+					* Catalog version of the apps in rawApps. Each appsChanged signal
+					* increments the version by one.
+					**/
+					var appVersion = 0;
+					var synced = false;
+					var pendingChanges = [];
+					
+					/**
+					* Applies the result of getAppChanges() or an appsChanged signal.
+					**/
+					var applyChanges = function(changes) {
+						appVersion = changes.version;
+						if (changes.removed.length > 0) {
+							removeApps(changes.removed);
+						}
+						if (changes.added.length > 0) {
+							addApps(changes.added);
+						}
+					};
+					
+					/**
+					* Fetches all changes since appVersion. Signals that arrive
+					* meanwhile are queued until the response has been applied.
+					**/
+					var fetchChanges = function() {
+						synced = false;
+						apiRequest('apps?since=' + appVersion, 'getAppChanges', appVersion).done(function(changes) {
+							if (changes.version >= appVersion) {
+								applyChanges(changes);
+							}
+							synced = true;
+							var queued = pendingChanges;
+							pendingChanges = [];
+							for (var i = 0; i < queued.length; i+=1) {
+								onAppsChanged(queued[i]);
+							}
+						});
+					};
+					
+					/**
+					* Handles an appsChanged signal. Changes that are already included
+					* are ignored, if a change is missing all changes are fetched again.
+					**/
+					var onAppsChanged = function(changes) {
+						if (!synced) {
+							pendingChanges.push(changes);
+						} else if (changes.version === appVersion + 1) {
+							applyChanges(changes);
+						} else if (changes.version > appVersion) {
+							fetchChanges();
+						}
+					};
+					
+					if (window.gameplay.getAppChanges !== undefined && window.gameplay.appsChanged !== undefined) {
+						// Fetch known apps, then receive only the changes of each provider
+						window.gameplay.appsChanged.connect(onAppsChanged);
+						window.gameplay.scanFinished.connect(function() {
+							rawApps.scanning(false);
+							rawApps.ready(true);
+						});
+						rawApps.scanning(true);
+						fetchChanges();
+						externalRequest('startAppScan');
+					} else if (window.gameplay.startAppScan !== undefined && window.gameplay.appsAdded !== undefined) {
+						// Receive apps as soon as each provider has finished
+						window.gameplay.appsAdded.connect(addApps);
+						window.gameplay.appsRemoved.connect(removeApps);
+						window.gameplay.scanFinished.connect(function() {
+							rawApps.scanning(false);
+							rawApps.ready(true);
+						});
+						rawApps.scanning(true);
+						externalRequest('startAppScan');
+					} else {
+						externalRequest('getApps').done(function(list) {
+							var result = [];
+							for (var i = 0; i < list.length; i+=1) {
+								result.push(new AppItem(list[i], hiddenApps, favouriteApps));
+							}
+							rawApps(result);
+							rawApps.ready(true);
+						});
+					}
 
 					/**
 					* List categories by id and (translated) label
@@ -183,6 +376,7 @@
 						});
 					});
 					apps.ready = ko.pureComputed(rawApps.ready);
+					apps.scanning = ko.pureComputed(rawApps.scanning);
 					apps.raw = ko.pureComputed(rawApps);
 
 					// Resolves an entry by its id
@@ -214,20 +408,27 @@
 					};
 
 					/**
-					* Returns a configuration option value. The value is cached in 'options'.
+					* Returns a configuration option value. All options are fetched with
+					* the first call, the value is cached in 'options'.
 					**/
 					var options = {};
+					var allOptions;
 					var getOption = function(section, option) {
 						var key = section + '/' + option;
 						if (options[key] === undefined) {
 							var result = ko.observable();
-							var ready = ko.observable();
+							var ready = ko.observable(false);
 
-							externalRequest('getOption', section, option).done(function(value) {
+							if (allOptions === undefined) {
+								allOptions = apiRequest('options', 'getOptions');
+							}
+							allOptions.done(function(values) {
+								var value = ((values || {})[section] || {})[option.toLowerCase()];
 								if (value === undefined || value === null) {
 									value = '';
 								}
 								result(value);
+								ready(true);
 							});
 
 							options[key ] = {
@@ -288,7 +489,8 @@
 					};
 
 					/**
-					* Get app status. This must be updated regulary via pull.
+					* Get app status. This is updated by the backend's appStatusChanged
+					* signal or, if not available, regulary via pull.
 					* The objects in this array are observable, so view components
 					* can react on status changes.
 					**/
@@ -310,7 +512,7 @@
 					* Updates the process status.
 					*/
 					var pullAppStatus = function() {
-						externalRequest('getAllAppStatus').done(function(result) {
+						apiRequest('status', 'getAllAppStatus').done(function(result) {
 							kom.fromJS(result, { '$key': 'id', '$merge': true }, status);
 							if (document.hidden || document.webengineHidden) {
 								window.setTimeout(pullAppStatus, 1000);
@@ -319,12 +521,26 @@
 							}
 						});
 					};
-					pullAppStatus();
+
+					if (window.gameplay.appStatusChanged !== undefined) {
+						// Status changes are pushed by the backend
+						window.gameplay.appStatusChanged.connect(function(result) {
+							kom.fromJS([result], { '$key': 'id', '$merge': true }, status);
+						});
+						apiRequest('status', 'getAllAppStatus').done(function(result) {
+							kom.fromJS(result, { '$key': 'id', '$merge': true }, status);
+						});
+					} else {
+						pullAppStatus();
+					}
 
 					/**
 					* Suspends all running apps
 					*/
 					var suspendAllApps = function() {
+						if (window.gameplay.suspendAll !== undefined) {
+							return externalRequest('suspendAll');
+						}
 						externalRequest('getAllAppStatus').done(function(result) {
 							for (var i = 0; i < result.length; i+=1) {
 								if (result[i].active) {
@@ -338,6 +554,10 @@
 					* Kills all running apps
 					**/
 					var stopAllApps = function() {
+						if (window.gameplay.stopAll !== undefined) {
+							// Stops all apps in parallel
+							return externalRequest('stopAll');
+						}
 						externalRequest('getAllAppStatus').done(function(result) {
 							for (var i = 0; i < result.length; i+=1) {
 								if (result[i].active) {
@@ -407,13 +627,54 @@
 	}
 
 	if (window.gameplayIsAsync === true) {
+		/**
+		* Requests that have been made in the current tick. They are
+		* sent with a single call to the backend's 'batch' method.
+		**/
+		var queue = [];
+
+		var defer = window.Promise ? function(callback) {
+			window.Promise.resolve().then(callback);
+		} : function(callback) {
+			window.setTimeout(callback, 0);
+		};
+
+		var send = function(request) {
+			var args = request.args.slice();
+			args.push(request.resolve);
+			window.gameplay[request.method].apply(window.gameplay, args);
+		};
+
+		var flush = function() {
+			var i;
+			var requests = queue;
+			queue = [];
+			if (requests.length === 1 || window.gameplay.batch === undefined) {
+				for (i = 0; i < requests.length; i+=1) {
+					send(requests[i]);
+				}
+				return;
+			}
+
+			var calls = [];
+			for (i = 0; i < requests.length; i+=1) {
+				calls.push([requests[i].method].concat(requests[i].args));
+			}
+			window.gameplay.batch(calls, function(results) {
+				for (var i = 0; i < requests.length; i+=1) {
+					requests[i].resolve(results[i]);
+				}
+			});
+		};
+
 		/**
 		 * Does an asynchronous request to Gameplay backends API.
 		 * Returns a promise object with the method 'done' that
 		 * can be used to register the value listener.
 		 *
 		 * First parameter must be the method name, but you can provide
-		 * additional arguments.
+		 * additional arguments. Requests made in the same tick are
+		 * coalesced into a single round trip.
 		 **/
 		factory(function externalRequest(method) {
 			var args = [];
@@ -422,14 +683,18 @@
 			}
 			var result;
 			var listeners = [];
-			args.push(function(value) {
+			var resolve = function(value) {
 				result = value;
 				for (var i = 0; i < listeners.length; i+=1) {
 					listeners[i].call(listeners[i], result);
 				}
 				listeners = undefined;
-			});
-			window.gameplay[method].apply(window.gameplay, args);
+			};
+
+			if (queue.length === 0) {
+				defer(flush);
+			}
+			queue.push({ method: method, args: args, resolve: resolve });
 
 			return {
 				done: function(listener) {